@@ -1,14 +1,33 @@
     
 import pandas as pd
+import numpy as np
 import os
 from sqlalchemy import create_engine
-import math
 import sys
 from pathlib import Path
 import re
 import time
+from functools import lru_cache
+from io import BytesIO
 from openpyxl.styles import PatternFill, Font, Alignment
-from openpyxl import load_workbook
+
+try:
+    from numba import njit
+    NUMBA_DISPONIBLE = True
+except ImportError:
+    # Numba es opcional: sin él, las funciones decoradas corren en Python puro
+    NUMBA_DISPONIBLE = False
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda funcion: funcion
+
+# En el .exe no hay archivo .py junto al módulo y Numba no puede ubicar su
+# caché de compilación (cache=True falla al importar): ahí se compila en memoria
+NUMBA_CACHE = not getattr(sys, 'frozen', False)
+
+# Volcados de depuración (tablas con to_string): solo con DEBUG_RESUMEN=1
+DEBUG_RESUMEN = os.environ.get('DEBUG_RESUMEN', '').strip() not in ('', '0')
 
 # ======================================================================================
 # FUNCIONES AUXILIARES PARA MANEJO DE RUTAS (EXE o Script)
@@ -57,50 +76,54 @@ def obtener_ruta_salida():
     # Plan D: Carpeta actual
     return os.getcwd()
 
-# Obtener ruta de salida al iniciar
-RUTA_SALIDA = obtener_ruta_salida()
-print(f"[INFO] Archivos se guardarán en: {RUTA_SALIDA}", flush=True)
+@lru_cache(maxsize=None)
+def ruta_salida():
+    """
+    Ruta de salida, resuelta en el primer uso y no al importar.
+    
+    Evita las comprobaciones de disco de obtener_ruta_salida en cada arranque;
+    el resultado se guarda para los siguientes llamados.
+    """
+    ruta = obtener_ruta_salida()
+    print(f"[INFO] Archivos se guardarán en: {ruta}", flush=True)
+    return ruta
 
 # ======================================================================================
 # FUNCIÓN: EXTRAER ANCHO DE ROLLO DESDE NOMBRE_COMPONENTE
 # ======================================================================================
 
-def extraer_ancho_rollo_mm(nombre_componente: str) -> float:
+# Número seguido de espacios opcionales y MM (case insensitive)
+_PATRON_ANCHO_ROLLO = re.compile(r'(\d+)\s*MM(?:\s|$)', re.IGNORECASE)
+
+# Medidas de etiqueta en el nombre del artículo (ver extraer_medidas_stock)
+_PATRON_PUNTO_INICIAL = re.compile(r'^\.(\d)')
+_PATRON_PUNTO_TRAS_ESPACIO = re.compile(r'(\s)\.(\d)')
+_PATRON_DOS_MEDIDAS = re.compile(r'([\d,\.]+)\s*[xX]\s*([\d,\.]+)')
+_PATRON_UNA_MEDIDA = re.compile(r'([\d,\.]+)\s*(?:mm|MM|Mm|mM)\b', re.IGNORECASE)
+_PATRON_NUMERO = re.compile(r'\d+\.?\d*')
+
+def extraer_ancho_rollo_mm_series(nombres: pd.Series) -> pd.Series:
     """
-    Extrae el ancho del rollo en mm desde el nombre del componente.
+    Extrae el ancho del rollo en mm desde los nombres de componente.
     
-    Busca patrones como:
-    - "280MM"
-    - "280 MM"
-    - "280mm"
-    - "280 mm"
+    Toma la primera coincidencia de _PATRON_ANCHO_ROLLO, por ejemplo "280MM",
+    "280 MM" o "280mm" en "LAMINADO FILM PETG 280 MM 45 MIC".
     
-    Retorna el número encontrado o None si no hay coincidencia.
+    La columna repite pocos componentes en muchas filas: el patrón se busca
+    solo en los nombres distintos y se expande a las filas con los códigos
+    de factorize.
     
     Args:
-        nombre_componente: Nombre del componente (ej: "LAMINADO FILM PETG 280 MM 45 MIC")
+        nombres: Serie con nombres de componentes
     
     Returns:
-        float: Ancho del rollo en mm, o None si no encuentra
+        pd.Series: Ancho del rollo en mm (float), NaN donde no encuentra
     """
-    if not nombre_componente or not isinstance(nombre_componente, str):
-        return None
-    
-    # Expresión regular para encontrar número seguido de espacios opcionales y MM
-    # Busca: número + espacios opcionales + MM (case insensitive)
-    patron = r'(\d+)\s*MM(?:\s|$)'
-    
-    # Buscar todas las coincidencias
-    coincidencias = re.findall(patron, nombre_componente, re.IGNORECASE)
-    
-    if coincidencias:
-        # Tomar la primera coincidencia y convertir a float
-        try:
-            return float(coincidencias[0])
-        except (ValueError, IndexError):
-            return None
-    
-    return None
+    codigos, unicos = pd.factorize(nombres)
+    anchos = pd.Series(unicos).str.extract(_PATRON_ANCHO_ROLLO, expand=False).astype(float).to_numpy()
+    # Código -1 (nombre nulo) toma el NaN agregado al final
+    anchos = np.append(anchos, np.nan)
+    return pd.Series(anchos[codigos], index=nombres.index, name=nombres.name)
 
 # ======================================================================================
 # MOTOR DE CÁLCULO - FUNCIONES VITALES INTEGRADAS
@@ -112,317 +135,276 @@ BANDERA_HORIZONTAL = 20  # mm de bandera (se restan del ancho útil)
 GAP_HORIZONTAL_OBJETIVO = 2.7  # Gap objetivo
 GAP_HORIZONTAL_MIN = 2.3
 GAP_HORIZONTAL_MAX = 20
-GAP_VERTICAL_OBJETIVO = 2.7
 GAP_VERTICAL_MIN = 2.5
 GAP_VERTICAL_MAX = 20
 MAX_REPETICIONES_VERTICALES = 8
 AJUSTE_DESARROLLO_REP_MM = 0.75  # mm adicionales por repeat
 
 # Conjuntos de cilindros disponibles
-CILINDROS_FB = sorted([60, 67, 70, 74, 77, 80, 84, 88, 91, 97, 99, 102, 105, 107, 108, 111,
-                        116, 117, 122, 127, 129, 168], reverse=True)
+CILINDROS_FB = (60, 67, 70, 74, 77, 80, 84, 88, 91, 97, 99, 102, 105, 107, 108, 111,
+                116, 117, 122, 127, 129, 168)
+# El motor recorre los cilindros de mayor a menor (ante empate gana el mayor)
+_CILINDROS_FB_DESC = tuple(reversed(CILINDROS_FB))
 
-class EvaluacionZUniforme:
-    """Resultado de evaluación de un Z particular"""
-    def __init__(self, z, desarrollo_mm, n, gap, diff_obj, valido, detalle):
-        self.z = z
-        self.desarrollo_mm = desarrollo_mm
-        self.n = n
-        self.gap = gap
-        self.diff_obj = diff_obj
-        self.valido = valido
-        self.detalle = detalle
+# Arreglos para evaluar todos los cilindros a la vez (grilla Z × n)
+_CILINDROS_FB_ARR = np.array(_CILINDROS_FB_DESC, dtype=np.int32)
+_CILINDROS_FB_DEV = _CILINDROS_FB_ARR * FACTOR_CILINDRO_A_MM  # Desarrollo de cada Z en mm
+_CILINDROS_FB_DEV.flags.writeable = False
+_REPETICIONES_N = np.arange(1, MAX_REPETICIONES_VERTICALES + 1)
+# Mismo arreglo en float64 para que la grilla no convierta enteros en cada operación
+_REPETICIONES_N_F = _REPETICIONES_N.astype(np.float64)
 
-def evaluar_z_uniforme(z: int, alto_etq: float, gap_obj: float,
-                       gap_min: float, gap_max: float, max_n: int) -> EvaluacionZUniforme:
+def _evaluar_z_grilla(altos: np.ndarray) -> tuple:
     """
-    Evalúa un Z particular para determinar cuántas etiquetas caben verticalmente.
+    Evalúa verticalmente todos los CILINDROS_FB para cada alto.
+    
+    Evalúa el tensor completo (alto, z, n) con operaciones NumPy en lugar de
+    iterar cilindro por cilindro y repetición por repetición.
     
     Args:
-        z: Número de cilindro (60-168)
-        alto_etq: Alto de etiqueta en mm
-        gap_obj: Gap objetivo en mm (2.7)
-        gap_min: Gap mínimo permitido (2.5)
-        gap_max: Gap máximo permitido (20)
-        max_n: Máximo número de repeticiones verticales
+        altos: Arreglo de altos de etiqueta en mm
     
     Returns:
-        EvaluacionZUniforme con n (repeticiones), gap, y validez
+        Tupla (valido, n, desarrollo, gap); valido/n/gap con forma [altos, Z]
+        y desarrollo alineado con _CILINDROS_FB_DESC (de mayor a menor)
     """
-    desarrollo = z * FACTOR_CILINDRO_A_MM
+    desarrollo = _CILINDROS_FB_DEV
+    ocupado = (_REPETICIONES_N_F * altos[:, None])[:, None, :]
+    gaps = (desarrollo[None, :, None] - ocupado) / _REPETICIONES_N_F
     
-    # Si el desarrollo es menor que una etiqueta, no es válido
-    if desarrollo < alto_etq:
-        return EvaluacionZUniforme(z, desarrollo, 0, 0.0, 9999.0, False, 
-                                  f"Desarrollo {desarrollo:.1f} mm < Alto etiqueta {alto_etq} mm")
+    # n cabe si el desarrollo alcanza; para n > 1 además el gap debe estar en rango
+    mascara = (desarrollo[None, :, None] >= ocupado) & (
+        (_REPETICIONES_N == 1) | ((gaps >= GAP_VERTICAL_MIN) & (gaps <= GAP_VERTICAL_MAX))
+    )
+    valido = mascara.any(axis=2)
     
-    mejor = None
+    # n es distinto en cada candidato, así que el mejor es siempre el mayor n válido
+    idx_n = mascara.shape[2] - 1 - np.argmax(mascara[:, :, ::-1], axis=2)
+    n = _REPETICIONES_N[idx_n]
+    gap = np.take_along_axis(gaps, idx_n[:, :, None], axis=2)[:, :, 0]
+    # n=1 es válido incluso con gap grande; al menos el gap mínimo como referencia
+    gap = np.where(n == 1, np.maximum(gap, GAP_VERTICAL_MIN), gap)
     
-    # Iterar sobre posibles n (repeticiones verticales)
-    for n in range(1, max_n + 1):
-        if desarrollo < n * alto_etq:
-            break
-        
-        gap = (desarrollo - n * alto_etq) / n
-        
-        if gap < 0:
-            continue
-        
-        # Para n > 1, validar que gap esté dentro de rango; n=1 siempre es válido
-        if n > 1 and (gap < gap_min or gap > gap_max):
-            continue
-        
-        # n=1 es válido incluso con gap grande, pero asignar gap_obj como referencia
-        if n == 1:
-            gap = max(gap, gap_min)  # Al menos el gap mínimo como referencia
-        
-        diff = abs(gap - gap_obj)
-        cand = (n, gap, diff)
-        
-        # Seleccionar mejor: Máximo n, luego menor diff del objetivo, luego menor gap
-        if mejor is None:
-            mejor = cand
-        else:
-            n_best, gap_best, diff_best = mejor
-            if (cand[0] > n_best) or (cand[0] == n_best and (cand[2] < diff_best or 
-                (cand[2] == diff_best and cand[1] < gap_best))):
-                mejor = cand
+    return valido, n, desarrollo, gap
+
+def _indice_menor_ml(valido: np.ndarray, n: np.ndarray, desarrollo: np.ndarray) -> np.ndarray:
+    """
+    Índice del Z de menor ML para cada fila de la grilla.
     
-    if mejor:
-        n_sel, gap_sel, diff_sel = mejor
-        return EvaluacionZUniforme(z, desarrollo, n_sel, gap_sel, diff_sel, True, "OK")
+    ML = unidades / (n × etq_eje) × (desarrollo + ajuste) / 1000, así que para
+    un mismo alto el orden entre Z solo depende de (desarrollo + ajuste) / n:
+    el ganador se conoce sin mirar unidades ni rollo y no hace falta recorrer
+    los Z por cada fila. Ante empate gana el primer Z (mayor cilindro).
+    """
+    with np.errstate(divide='ignore'):
+        mm_por_n = (desarrollo + AJUSTE_DESARROLLO_REP_MM) / n
+    return np.argmin(np.where(valido, mm_por_n, np.inf), axis=-1)
+
+def _evaluar_rollo_vectorizado(anchos_mm: np.ndarray, anchos_etq: np.ndarray) -> tuple:
+    """
+    Evalúa cómo se distribuyen horizontalmente las etiquetas en cada rollo
+    (gap y bandera estándar).
     
-    return EvaluacionZUniforme(z, desarrollo, 0, 0.0, 9999.0, False, "Sin combinación válida de n")
+    Returns:
+        Tupla (etq_eje, gap_entre) de arreglos; gap_entre es NaN donde no hay
+        gap entre etiquetas (una sola etiqueta con paso estándar) o el rollo
+        no es válido
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        paso = anchos_etq + GAP_HORIZONTAL_OBJETIVO
+        
+        # Intentar primero CON bandera; si no cabe ninguna, usar el ancho completo.
+        # En filas válidas (rollo > 0, paso > 0) el cociente nunca es negativo y
+        # las inválidas se anulan al final, así que no hace falta acotarlo en 0
+        ancho_util = np.maximum(0.0, anchos_mm - BANDERA_HORIZONTAL)
+        etq_eje = np.floor_divide(ancho_util, paso)
+        sin_bandera = etq_eje <= 0
+        ancho_util = np.where(sin_bandera, anchos_mm, ancho_util)
+        etq_eje = np.where(sin_bandera, np.floor_divide(ancho_util, paso), etq_eje)
+        
+        # Si aún no cabe con paso estándar, permitir al menos 1 etiqueta
+        forzar_una = (etq_eje <= 0) & (ancho_util >= anchos_etq)
+        etq_eje = np.where(forzar_una, 1, etq_eje)
+        gap_total = np.maximum(0.0, ancho_util - etq_eje * anchos_etq)
+        gap_entre = np.where(forzar_una, gap_total,
+                             np.where(etq_eje > 1, gap_total / (etq_eje - 1), np.nan))
+        
+        invalido = (anchos_mm <= 0) | (paso <= 0)
+        etq_eje = np.where(invalido, 0, etq_eje).astype(np.int64)
+        gap_entre = np.where(invalido, np.nan, gap_entre)
+    
+    return etq_eje, gap_entre
 
-def evaluar_rollo_estandar(ancho_mm: float, ancho_etq: float, gap_h_usado: float, 
-                           bandera_mm: float) -> dict:
+def obtener_z_sugerido_batch(altos, anchos, unidades, anchos_rollo) -> dict:
     """
-    Evalúa cómo se distribuyen horizontalmente las etiquetas en el rollo.
+    Busca el Z (cilindro) óptimo que minimiza metraje para muchas filas a la vez.
+    
+    La evaluación vertical se hace una vez por alto distinto (tensor
+    [alto, z, n]) y el metraje solo del Z elegido en cada fila, con
+    operaciones NumPy en lugar de recorrer las filas.
     
     Args:
-        ancho_mm: Ancho del rollo en mm
-        ancho_etq: Ancho de etiqueta en mm
-        gap_h_usado: Gap horizontal usado en mm
-        bandera_mm: Ancho de bandera en mm (se resta del ancho útil)
+        altos: Altos de etiqueta en mm
+        anchos: Anchos de etiqueta en mm
+        unidades: Cantidad de unidades a producir (enteros)
+        anchos_rollo: Ancho del rollo en mm por fila
     
     Returns:
-        Dict con etq_eje (cantidad horizontal), gap_entre, aprovechamiento, etc.
+        Dict de arreglos (z, n, desarrollo_mm, gap_vertical, etq_eje,
+        gap_horizontal_real, etq_repeat, repeticiones, ml, m2, ancho_rollo_mm,
+        es_valido, rollo_alternativo, motivo_imposibilidad; NaN donde no aplica),
+        más 'sin_solucion' (filas cuyo alto no cabe en ningún cilindro)
     """
-    if ancho_mm <= 0:
-        return {"etq_eje": 0, "gap_entre": None, "aprovechamiento_pct": 0.0}
-    
-    paso = ancho_etq + gap_h_usado
-    if paso <= 0:
-        return {"etq_eje": 0, "gap_entre": None, "aprovechamiento_pct": 0.0}
-    
-    # Intentar primero CON bandera (20mm de margen)
-    ancho_util = max(0.0, ancho_mm - bandera_mm)
-    etq_eje = max(0, int(ancho_util // paso))
-    
-    # Si no cabe ni una etiqueta CON bandera, ignorar bandera y usar todo el ancho
-    if etq_eje <= 0:
-        ancho_util = ancho_mm  # Usar ancho completo sin restar bandera
-        etq_eje = max(0, int(ancho_util // paso))
-    
-    # Si aún no cabe ni una etiqueta con paso estándar, permitir al menos 1 etiqueta
-    # (el gap será mayor pero la producción sigue siendo posible)
-    if etq_eje <= 0 and ancho_util >= ancho_etq:
-        etq_eje = 1
-        # Recalcular gap con solo 1 etiqueta
-        gap_total = max(0.0, ancho_util - ancho_etq)
-        gap_entre = gap_total  # Un solo gap a un lado
-    else:
-        gap_total = max(0.0, ancho_util - etq_eje * ancho_etq)
-        gap_entre = gap_total / (etq_eje - 1) if etq_eje > 1 else None
-    
-    aprovechamiento = (etq_eje * ancho_etq) / ancho_util * 100 if ancho_util > 0 else 0.0
+    altos = np.asarray(altos, dtype=float)
+    anchos = np.asarray(anchos, dtype=float)
+    unidades = np.asarray(unidades, dtype=np.int64)
+    anchos_rollo = np.asarray(anchos_rollo, dtype=float)
+    
+    # Evaluación vertical por alto único; lo que solo depende del alto (Z de
+    # menor ML, primer Z válido) se resuelve por alto y se expande a las filas
+    # sin materializar la grilla [filas, Z]
+    altos_unicos, inverso = np.unique(altos, return_inverse=True)
+    valido_u, n_u, desarrollo, gap_u = _evaluar_z_grilla(altos_unicos)
+    idx_menor_ml = _indice_menor_ml(valido_u, n_u, desarrollo)[inverso]
+    idx_primer_z = np.argmax(valido_u, axis=1)[inverso]
+    hay_z = valido_u.any(axis=1)[inverso]
+    
+    # Evaluación horizontal con el rollo indicado y, como alternativa, con el rollo base
+    etq_eje, gap_entre = _evaluar_rollo_vectorizado(anchos_rollo, anchos)
+    etq_eje_base, gap_entre_base = _evaluar_rollo_vectorizado(np.full_like(anchos_rollo, ROLLO_BASE_MM), anchos)
+    usar_rollo = etq_eje > 0
+    etq_eje = np.where(usar_rollo, etq_eje, etq_eje_base)
+    gap_entre = np.where(usar_rollo, gap_entre, gap_entre_base)
+    ancho_rollo_final = np.where(usar_rollo, anchos_rollo, ROLLO_BASE_MM)
+    es_valido = hay_z & (etq_eje > 0)
+    
+    # Gana el Z de menor ML del alto; si el ancho no cabe en ningún rollo,
+    # se asigna el primer Z válido (mayor cilindro)
+    idx_z = np.where(es_valido, idx_menor_ml, idx_primer_z)
+    
+    n = n_u[inverso, idx_z]
+    desarrollo_sel = desarrollo[idx_z]
+    etq_repeat = n * etq_eje
+    with np.errstate(divide='ignore', invalid='ignore'):
+        repeticiones = unidades / etq_repeat
+        ml = (repeticiones * desarrollo_sel + repeticiones * AJUSTE_DESARROLLO_REP_MM) / 1000.0
+        m2 = ml * (ancho_rollo_final / 1000.0)
+    
+    def solo_validos(valores):
+        return np.where(es_valido, valores, np.nan)
+    
+    motivo = np.full(len(altos), None, dtype=object)
+    for i in np.flatnonzero(hay_z & ~es_valido):
+        if anchos_rollo[i] != ROLLO_BASE_MM:
+            motivo[i] = f"Ancho {int(anchos[i])}mm no cabe incluso en rollo estandar {int(ROLLO_BASE_MM)}mm"
+        else:
+            motivo[i] = f"Ancho {int(anchos[i])}mm no cabe en rollo {int(anchos_rollo[i])}mm"
     
     return {
-        "etq_eje": etq_eje,
-        "gap_entre": gap_entre,
-        "aprovechamiento_pct": aprovechamiento,
-        "ancho_util": ancho_util
+        "z": np.where(hay_z, _CILINDROS_FB_ARR[idx_z], np.nan),
+        "n": solo_validos(n),
+        "desarrollo_mm": solo_validos(desarrollo_sel),
+        "gap_vertical": solo_validos(gap_u[inverso, idx_z]),
+        "etq_eje": solo_validos(etq_eje),
+        "gap_horizontal_real": np.where(es_valido, gap_entre, np.where(hay_z, 0.0, np.nan)),
+        "etq_repeat": solo_validos(etq_repeat),
+        "repeticiones": solo_validos(repeticiones),
+        "ml": solo_validos(ml),
+        "m2": solo_validos(m2),
+        "ancho_rollo_mm": np.where(hay_z, ancho_rollo_final, anchos_rollo),
+        "es_valido": es_valido,
+        "rollo_alternativo": es_valido & ~usar_rollo,
+        "motivo_imposibilidad": motivo,
+        "sin_solucion": ~hay_z
     }
 
-def calcular_metraje_material(unidades: int, etq_repeat: int, desarrollo_mm: float,
-                              ancho_rollo_mm: float, ajuste_mm: float) -> dict:
+# =====================================================================
+# FUNCIÓN: CREAR TABLA RESUMEN VITAL
+# =====================================================================
+def unidad_en(unidades: pd.Series, opciones: list) -> np.ndarray:
     """
-    Calcula metros lineales y metros cuadrados necesarios.
+    Indica por fila si str(unidad).strip().upper() está en opciones.
     
-    Args:
-        unidades: Cantidad de etiquetas a producir
-        etq_repeat: Etiquetas por repetición (n_vertical × etq_eje)
-        desarrollo_mm: Desarrollo del cilindro en mm
-        ancho_rollo_mm: Ancho del rollo en mm
-        ajuste_mm: Ajuste adicional por repetición (típicamente 0.75 mm)
+    La normalización se hace solo sobre los valores distintos (la columna
+    tiene pocas unidades) y se expande a las filas con los códigos de factorize.
     
     Returns:
-        Dict con repeticiones, ML, M2
+        np.ndarray de bool alineado con unidades
     """
-    if etq_repeat <= 0 or desarrollo_mm <= 0 or ancho_rollo_mm <= 0:
-        return {"repeticiones_reales": 0.0, "ml": 0.0, "m2": 0.0}
-    
-    # Calcular numero de vueltas necesarias del cilindro
-    repeticiones_reales = unidades / etq_repeat
-    
-    # Metraje lineal = (repeticiones × desarrollo del cilindro) + merma
-    longitud_sin_merma_mm = repeticiones_reales * desarrollo_mm
-    merma_mm = repeticiones_reales * ajuste_mm
-    longitud_total_mm = longitud_sin_merma_mm + merma_mm
+    codigos, valores = pd.factorize(unidades, use_na_sentinel=False)
+    normalizadas = pd.Series(np.asarray(valores, dtype=object)).map(lambda v: str(v).strip().upper())
+    return normalizadas.isin(opciones).to_numpy()[codigos]
+
+@njit(cache=NUMBA_CACHE)
+def _cascadear_stock(reinicio, stock_inicial, metros_merma, metros_factor):
+    """
+    Cascadeo dual de stock fila a fila (compilado con Numba si está disponible).
     
-    # Convertir a metros
-    ml = longitud_total_mm / 1000.0
+    En cada fila con reinicio=True (cambio de componente) ambos lados parten del
+    stock inicial; luego cada fila descuenta sus metros del stock que recibe.
     
-    # Metros cuadrados = ML × ancho del rollo en metros
-    m2 = ml * (ancho_rollo_mm / 1000.0)
+    Returns:
+        Tupla (stock_acumulado, stock_final_m2, stock_acumulado_factor, stock_final_factor)
+    """
+    total = len(stock_inicial)
+    stock_acumulado = np.empty(total)
+    stock_final_m2 = np.empty(total)
+    stock_acumulado_factor = np.empty(total)
+    stock_final_factor = np.empty(total)
     
-    return {
-        "repeticiones_reales": repeticiones_reales,
-        "ml": ml,
-        "m2": m2
-    }
+    stock_tradicional = 0.0      # Para lado izquierdo (Motor)
+    stock_factor = 0.0           # Para lado derecho (Factor)
+    for i in range(total):
+        if reinicio[i]:
+            stock_tradicional = stock_inicial[i]
+            stock_factor = stock_inicial[i]
+        
+        # Lado izquierdo: fórmula tradicional (metros con merma)
+        stock_acumulado[i] = stock_tradicional
+        stock_tradicional = stock_tradicional - metros_merma[i]
+        stock_final_m2[i] = stock_tradicional
+        
+        # Lado derecho: cálculos por factor
+        stock_acumulado_factor[i] = stock_factor
+        stock_factor = stock_factor - metros_factor[i]
+        stock_final_factor[i] = stock_factor
+    
+    return stock_acumulado, stock_final_m2, stock_acumulado_factor, stock_final_factor
 
-def obtener_z_sugerido(alto_etq: float, ancho_etq: float, unidades: int, ancho_rollo_mm: float = None) -> tuple:
+def _cascadear_stock_por_grupo(reinicio, stock_inicial, metros_merma, metros_factor):
     """
-    Busca el Z (cilindro) óptimo que minimiza metraje.
+    Versión NumPy de _cascadear_stock para cuando Numba no está disponible.
     
-    Args:
-        alto_etq: Alto de etiqueta en mm
-        ancho_etq: Ancho de etiqueta en mm
-        unidades: Cantidad de unidades a producir
-        ancho_rollo_mm: Ancho del rollo en mm (extrae de Nombre_Componente o usa ROLLO_BASE_MM)
+    Dentro de cada componente el stock final es una resta acumulada:
+    np.subtract.accumulate([stock, m1, m2, ...]) = ((stock - m1) - m2) - ...,
+    la misma secuencia de restas que el recorrido fila a fila (una suma
+    acumulada con cumsum redondearía distinto). Se itera por componente,
+    no por fila.
     
     Returns:
-        Dict con mejor Z y sus métricas, o dict con rollo/Z pero motivo_imposibilidad si es técnicamente imposible
+        Tupla (stock_acumulado, stock_final_m2, stock_acumulado_factor, stock_final_factor)
     """
-    # Si no se proporciona ancho_rollo_mm, usar valor por defecto
-    if ancho_rollo_mm is None:
-        ancho_rollo_mm = ROLLO_BASE_MM
-    
-    mejor = None
-    motivo_imposibilidad = None
-    z_fallback = None  # Para guardar Z si es necesario
-    
-    for z in CILINDROS_FB:
-        # Evaluar Z verticalmente
-        ev_z = evaluar_z_uniforme(z, alto_etq, GAP_VERTICAL_OBJETIVO,
-                                  GAP_VERTICAL_MIN, GAP_VERTICAL_MAX, 
-                                  MAX_REPETICIONES_VERTICALES)
-        
-        if not ev_z.valido:
-            # Si el alto no cabe en ningun Z, guardar motivo
-            if motivo_imposibilidad is None:
-                motivo_imposibilidad = f"Alto {int(alto_etq)}mm no cabe en ningun cilindro disponible (60-168mm)"
-            continue
-        
-        # Evaluar rollo horizontalmente (con ancho_rollo_mm extraído)
-        ev_rollo = evaluar_rollo_estandar(ancho_rollo_mm, ancho_etq, 
-                                          GAP_HORIZONTAL_OBJETIVO, BANDERA_HORIZONTAL)
-        
-        if ev_rollo["etq_eje"] <= 0:
-            # Guardar este Z como fallback por si no hay ninguno viable
-            if z_fallback is None:
-                z_fallback = z
-                motivo_imposibilidad = f"Ancho {int(ancho_etq)}mm no cabe en rollo {int(ancho_rollo_mm)}mm"
-            continue
-        
-        # Calcular etiquetas por repetición
-        etq_repeat = ev_z.n * ev_rollo["etq_eje"]
-        
-        # Calcular metraje (usando ancho_rollo_mm extraído)
-        metraje = calcular_metraje_material(unidades, etq_repeat, ev_z.desarrollo_mm,
-                                           ancho_rollo_mm, AJUSTE_DESARROLLO_REP_MM)
-        
-        # Seleccionar mejor por menor ML
-        if mejor is None or metraje["ml"] < mejor["ml"]:
-            mejor = {
-                "z": z,
-                "n": ev_z.n,
-                "desarrollo_mm": ev_z.desarrollo_mm,
-                "gap_vertical": ev_z.gap,
-                "etq_eje": ev_rollo["etq_eje"],
-                "gap_horizontal_real": ev_rollo["gap_entre"],
-                "etq_repeat": etq_repeat,
-                "repeticiones": metraje["repeticiones_reales"],
-                "ml": metraje["ml"],
-                "m2": metraje["m2"],
-                "ancho_rollo_mm": ancho_rollo_mm,
-                "es_valido": True
-            }
-    
-    # Si hay solución válida, retornarla
-    if mejor is not None:
-        return mejor
-    
-    # Si no hay solución con el ancho especificado y no es el rollo base, intentar con rollo más grande
-    if ancho_rollo_mm != ROLLO_BASE_MM:
-        z_fallback_330 = None
-        motivo_imposibilidad_330 = None
-        
-        for z in CILINDROS_FB:
-            ev_z = evaluar_z_uniforme(z, alto_etq, GAP_VERTICAL_OBJETIVO,
-                                      GAP_VERTICAL_MIN, GAP_VERTICAL_MAX, 
-                                      MAX_REPETICIONES_VERTICALES)
-            if not ev_z.valido:
-                continue
-            
-            ev_rollo = evaluar_rollo_estandar(ROLLO_BASE_MM, ancho_etq, 
-                                              GAP_HORIZONTAL_OBJETIVO, BANDERA_HORIZONTAL)
-            if ev_rollo["etq_eje"] <= 0:
-                if z_fallback_330 is None:
-                    z_fallback_330 = z
-                    motivo_imposibilidad_330 = f"Ancho {int(ancho_etq)}mm no cabe incluso en rollo estandar {int(ROLLO_BASE_MM)}mm"
-                continue
-            
-            etq_repeat = ev_z.n * ev_rollo["etq_eje"]
-            metraje = calcular_metraje_material(unidades, etq_repeat, ev_z.desarrollo_mm,
-                                               ROLLO_BASE_MM, AJUSTE_DESARROLLO_REP_MM)
-            
-            if mejor is None or metraje["ml"] < mejor["ml"]:
-                mejor = {
-                    "z": z,
-                    "n": ev_z.n,
-                    "desarrollo_mm": ev_z.desarrollo_mm,
-                    "gap_vertical": ev_z.gap,
-                    "etq_eje": ev_rollo["etq_eje"],
-                    "gap_horizontal_real": ev_rollo["gap_entre"],
-                    "etq_repeat": etq_repeat,
-                    "repeticiones": metraje["repeticiones_reales"],
-                    "ml": metraje["ml"],
-                    "m2": metraje["m2"],
-                    "ancho_rollo_mm": ROLLO_BASE_MM,
-                    "es_valido": True,
-                    "rollo_alternativo": True
-                }
-        
-        if mejor is not None:
-            return mejor
-        
-        # Si tampoco con rollo base funcionó, retornar fallback con motivo
-        if z_fallback_330 is not None:
-                return {
-                "z": z_fallback_330,
-                "ancho_rollo_mm": ROLLO_BASE_MM,
-                "es_valido": False,
-                "motivo_imposibilidad": motivo_imposibilidad_330,
-                "gap_horizontal_real": 0  # GAP de 0 para marcar imposibilidad
-            }
-    
-    # Si llegamos aquí, es imposible con cualquier rollo
-    if z_fallback is not None and motivo_imposibilidad:
-        return {
-            "z": z_fallback,
-            "ancho_rollo_mm": ancho_rollo_mm,
-            "es_valido": False,
-            "motivo_imposibilidad": motivo_imposibilidad,
-            "gap_horizontal_real": 0  # GAP de 0 para marcar imposibilidad
-        }
-    
-    return None
+    total = len(stock_inicial)
+    inicios = np.flatnonzero(reinicio)
+    stocks = stock_inicial[inicios]
+    # Filas antes del primer reinicio (solo si el primer componente es None): parten de 0
+    if total and not reinicio[0]:
+        inicios = np.concatenate(([0], inicios))
+        stocks = np.concatenate(([0.0], stocks))
+    fines = np.append(inicios[1:], total)
+    
+    resultados = []
+    for metros in (metros_merma, metros_factor):
+        stock_previo = np.empty(total)
+        stock_final = np.empty(total)
+        for inicio, fin, stock in zip(inicios.tolist(), fines.tolist(), stocks.tolist()):
+            restas = np.subtract.accumulate(np.concatenate(([stock], metros[inicio:fin])))
+            stock_previo[inicio:fin] = restas[:-1]
+            stock_final[inicio:fin] = restas[1:]
+        resultados += [stock_previo, stock_final]
+    
+    return tuple(resultados)
 
-# =====================================================================
-# FUNCIÓN: CREAR TABLA RESUMEN VITAL
-# =====================================================================
 def crear_tabla_resumen(df_pedidos_componentes_stock, df_pedidos_pendientes=None, df_listademateriales=None):
     """
     Crea la tabla RESUMEN VITAL a partir de df_pedidos_componentes_stock
@@ -492,43 +474,67 @@ def crear_tabla_resumen(df_pedidos_componentes_stock, df_pedidos_pendientes=None
     
     # Seleccionar solo columnas que existan en el dataframe
     columnas_disponibles = [col for col in columnas_base if col in df_pedidos_componentes_stock.columns]
-    df_resumen = df_pedidos_componentes_stock[columnas_disponibles].copy()
+    # reindex ya devuelve un DataFrame nuevo (sin marca de "copia de un slice"),
+    # así que no hace falta un .copy() encima que duplique otra vez las columnas
+    df_resumen = df_pedidos_componentes_stock.reindex(columns=columnas_disponibles)
     
     # Agregar Pendiente (Nota_Ventas) desde df_pedidos_pendientes
+    # Si la clave es única la búsqueda es 1:1 y basta con map/reindex sobre un
+    # índice, sin armar el frame del merge. Si no, se mantiene el merge: una
+    # clave con varios valores genera una fila por valor.
+    # drop_duplicates solo hace falta si la clave viene repetida desde la fuente.
     if df_pedidos_pendientes is not None:
         # Merge para obtener Pendiente
-        df_nota_ventas = df_pedidos_pendientes[['Codigo', 'Pendiente']].drop_duplicates()
-        df_resumen = df_resumen.merge(df_nota_ventas, left_on='Codigo', right_on='Codigo', how='left')
+        df_nota_ventas = df_pedidos_pendientes[['Codigo', 'Pendiente']]
+        if not df_nota_ventas['Codigo'].is_unique:
+            df_nota_ventas = df_nota_ventas.drop_duplicates()
+        if df_nota_ventas['Codigo'].is_unique:
+            df_resumen = df_resumen.reset_index(drop=True)
+            df_resumen['Pendiente'] = df_resumen['Codigo'].map(df_nota_ventas.set_index('Codigo')['Pendiente'])
+        else:
+            df_resumen = df_resumen.merge(df_nota_ventas, left_on='Codigo', right_on='Codigo', how='left')
     else:
         df_resumen['Pendiente'] = 0.0
     
     # Agregar Cantidad y Unidad_medida desde df_listademateriales
     if df_listademateriales is not None:
         # Merge para obtener Factor_unidades (renombrado desde Cantidad) y Unidad_medida
-        df_factor = df_listademateriales[['Prod_padre', 'Componente', 'Cantidad', 'Unidad_medida']].drop_duplicates()
-        df_resumen = df_resumen.merge(df_factor, left_on=['Prod_padre', 'Componente'], 
-                                      right_on=['Prod_padre', 'Componente'], how='left')
+        df_factor = df_listademateriales[['Prod_padre', 'Componente', 'Cantidad', 'Unidad_medida']]
+        df_factor_indexado = df_factor.set_index(['Prod_padre', 'Componente'])
+        if not df_factor_indexado.index.is_unique:
+            df_factor = df_factor.drop_duplicates()
+            df_factor_indexado = df_factor.set_index(['Prod_padre', 'Componente'])
+        if df_factor_indexado.index.is_unique:
+            df_resumen = df_resumen.reset_index(drop=True)
+            claves = pd.MultiIndex.from_frame(df_resumen[['Prod_padre', 'Componente']])
+            df_factor_filas = df_factor_indexado.reindex(claves).reset_index(drop=True)
+            df_resumen['Cantidad'] = df_factor_filas['Cantidad']
+            df_resumen['Unidad_medida'] = df_factor_filas['Unidad_medida']
+        else:
+            df_resumen = df_resumen.merge(df_factor, left_on=['Prod_padre', 'Componente'], 
+                                          right_on=['Prod_padre', 'Componente'], how='left')
     else:
         df_resumen['Cantidad'] = 0.0
         df_resumen['Unidad_medida'] = ''
     
     # Convertir a numéricos y llenar NaN con 0
-    df_resumen['Pendiente'] = pd.to_numeric(df_resumen['Pendiente'], errors='coerce').fillna(0)
-    df_resumen['Cantidad'] = pd.to_numeric(df_resumen['Cantidad'], errors='coerce').fillna(0)
-    df_resumen['M2_sin_merma'] = pd.to_numeric(df_resumen['M2_sin_merma'], errors='coerce').fillna(0)
-    df_resumen['StockAcumulado'] = pd.to_numeric(df_resumen['StockAcumulado'], errors='coerce').fillna(0)
-    df_resumen['FechaEntrega'] = pd.to_datetime(df_resumen['FechaEntrega'], errors='coerce')
+    # (solo se convierten las columnas que no llegan ya con tipo numérico/fecha)
+    for columna in ['Pendiente', 'Cantidad', 'M2_sin_merma', 'StockAcumulado']:
+        if not pd.api.types.is_numeric_dtype(df_resumen[columna]):
+            df_resumen[columna] = pd.to_numeric(df_resumen[columna], errors='coerce')
+        df_resumen[columna] = df_resumen[columna].fillna(0)
+    if not pd.api.types.is_datetime64_any_dtype(df_resumen['FechaEntrega']):
+        df_resumen['FechaEntrega'] = pd.to_datetime(df_resumen['FechaEntrega'], errors='coerce')
     
     # ═══════════════════════════════════════════════════════════════════════════════
     # NUEVA COLUMNA: ETIQUETAS_A_PRODUCIR
     # ═══════════════════════════════════════════════════════════════════════════════
     # Si Unidad_Medida = UNIDAD → Pendiente
     # Si Unidad_Medida = MILES o MIL → Pendiente × 1000
-    df_resumen['Etiquetas_a_Producir'] = df_resumen.apply(
-        lambda row: (row['Pendiente'] * 1000 
-                    if str(row.get('Unidad_medida', '')).strip().upper() in ['MILES', 'MIL']
-                    else row['Pendiente']),
-        axis=1
+    df_resumen['Etiquetas_a_Producir'] = np.where(
+        unidad_en(df_resumen['Unidad_medida'], ['MILES', 'MIL']),
+        df_resumen['Pendiente'] * 1000,
+        df_resumen['Pendiente']
     )
     
     # ═══════════════════════════════════════════════════════════════════════════════
@@ -536,30 +542,29 @@ def crear_tabla_resumen(df_pedidos_componentes_stock, df_pedidos_pendientes=None
     # ═══════════════════════════════════════════════════════════════════════════════
     # Si el STOCK INICIAL de un componente es negativo, convertir a 0
     # Esto indica que el componente NO existe en BD pero tiene valor errado asignado
-    negativos_iniciales = 0
-    for componente_unico in df_resumen['Componente'].unique():
-        filas_componente = df_resumen[df_resumen['Componente'] == componente_unico]
-        if len(filas_componente) > 0:
-            idx_primera = filas_componente.index[0]
-            stock_inicial = df_resumen.at[idx_primera, 'StockAcumulado']
-            if stock_inicial < 0:
-                print(f"[ADVERTENCIA] Stock inicial negativo para componente {componente_unico}: {stock_inicial:.4f} → Reemplazando con 0", flush=True)
-                df_resumen.at[idx_primera, 'StockAcumulado'] = 0
-                negativos_iniciales += 1
+    # Primera fila de cada componente (en orden de aparición)
+    primeras = df_resumen.groupby('Componente', sort=False).head(1)
+    primeras_negativas = primeras[primeras['StockAcumulado'] < 0]
+    for componente_unico, stock_inicial in zip(primeras_negativas['Componente'], primeras_negativas['StockAcumulado']):
+        print(f"[ADVERTENCIA] Stock inicial negativo para componente {componente_unico}: {stock_inicial:.4f} → Reemplazando con 0", flush=True)
+    df_resumen.loc[primeras_negativas.index, 'StockAcumulado'] = 0
+    negativos_iniciales = len(primeras_negativas)
     
     if negativos_iniciales > 0:
         print(f"[INFO] Se corrigieron {negativos_iniciales} componentes con stock inicial NEGATIVO", flush=True)
     
     # CASCADEO DE STOCK POR COMPONENTE Y FECHA
     # Ordenar por Componente y Fecha_Entrega (más antigua primero)
-    df_resumen = df_resumen.sort_values(by=['Componente', 'FechaEntrega']).reset_index(drop=True)
+    # ignore_index deja el índice 0..n-1 en el mismo paso (sin la copia extra de reset_index)
+    df_resumen = df_resumen.sort_values(by=['Componente', 'FechaEntrega'], ignore_index=True)
     
     # Calcular Metros_Cuadrados_Con_Merma = Metros_Cuadrados × 1.12 (12% extra de merma)
     # Este cálculo se hace ANTES del cascadeo porque se necesita para la fórmula tradicional
+    # (las columnas derivadas se calculan aparte y se agregan juntas con un solo assign)
     if 'M2_sin_merma' in df_resumen.columns:
-        df_resumen['Metros_Cuadrados_Con_Merma'] = df_resumen['M2_sin_merma'] * 1.12
+        metros_con_merma = df_resumen['M2_sin_merma'] * 1.12
     else:
-        df_resumen['Metros_Cuadrados_Con_Merma'] = 0.0
+        metros_con_merma = 0.0
     
     # ═══════════════════════════════════════════════════════════════════════════════
     # CALCULAR FACTOR_UNIFICADO (ANTES de Metros_Cuadrados_Factor)
@@ -570,39 +575,47 @@ def crear_tabla_resumen(df_pedidos_componentes_stock, df_pedidos_pendientes=None
     # 3. Si no: mantener Cantidad como está
     
     # DEBUG: Verificar valores de Cantidad y Unidad_medida ANTES de calcular
-    print("\n[DEBUG] VERIFICACION - Factor_unificado (NUEVA REGLA)", flush=True)
-    print("─" * 100, flush=True)
-    print(f"Cantidad (min): {df_resumen['Cantidad'].min()} | (max): {df_resumen['Cantidad'].max()}", flush=True)
-    print(f"Unidad_medida UNIQUE: {df_resumen['Unidad_medida'].unique()}", flush=True)
-    print("\nPrimeros 10 registros:", flush=True)
-    print(df_resumen[['Cantidad', 'Unidad_medida']].head(10).to_string(), flush=True)
-    print("─" * 100, flush=True)
-    
-    df_resumen['Factor_unificado'] = df_resumen.apply(
-        lambda row: (row['Cantidad'] / 1000 if row['Cantidad'] > 1 else row['Cantidad'])
-                    if str(row.get('Unidad_medida', '')).strip().upper() == 'UNIDAD'
-                    else (row['Cantidad'] / 1000 if row['Cantidad'] > 1 else row['Cantidad']),
-        axis=1
+    if DEBUG_RESUMEN:
+        print("\n[DEBUG] VERIFICACION - Factor_unificado (NUEVA REGLA)")
+        print("─" * 100)
+        cantidad_min, cantidad_max = df_resumen['Cantidad'].agg(['min', 'max'])
+        print(f"Cantidad (min): {cantidad_min} | (max): {cantidad_max}")
+        print(f"Unidad_medida UNIQUE: {df_resumen['Unidad_medida'].unique()}")
+        print("\nPrimeros 10 registros:")
+        print(df_resumen[['Cantidad', 'Unidad_medida']].head(10).to_string())
+        print("─" * 100)
+    
+    # La regla es la misma para UNIDAD y para el resto de unidades
+    factor_unificado = np.where(
+        df_resumen['Cantidad'] > 1,
+        df_resumen['Cantidad'] / 1000,
+        df_resumen['Cantidad']
     )
     
-    # Mostrar resultado del Factor_unificado
-    print("\n[DEBUG] RESULTADO - Factor_unificado calculado (NUEVA REGLA)", flush=True)
-    print("─" * 100, flush=True)
-    print(df_resumen[['Cantidad', 'Unidad_medida', 'Factor_unificado']].head(10).to_string(), flush=True)
-    print("─" * 100, flush=True)
-    
     # ═══════════════════════════════════════════════════════════════════════════════
     # NUEVA COLUMNA: METROS_CUADRADOS_FACTOR_SISTEMA
     # ═══════════════════════════════════════════════════════════════════════════════
-    # Metros_Cuadrados_Factor_Sistema = Pendiente × Cantidad (directo, sin normalizar)
-    df_resumen['Metros_Cuadrados_Factor_Sistema'] = df_resumen['Pendiente'] * df_resumen['Cantidad']
-    
-    # Calcular Metros_Cuadrados_Factor = Pendiente × Factor_unificado (DESPUÉS de Factor_unificado)
-    df_resumen['Metros_Cuadrados_Factor'] = df_resumen['Pendiente'] * df_resumen['Factor_unificado']
+    columnas_derivadas = {
+        'Metros_Cuadrados_Con_Merma': metros_con_merma,
+        'Factor_unificado': factor_unificado,
+        # Metros_Cuadrados_Factor_Sistema = Pendiente × Cantidad (directo, sin normalizar)
+        'Metros_Cuadrados_Factor_Sistema': df_resumen['Pendiente'] * df_resumen['Cantidad'],
+        # Metros_Cuadrados_Factor = Pendiente × Factor_unificado
+        'Metros_Cuadrados_Factor': df_resumen['Pendiente'] * factor_unificado,
+    }
     
     # Calcular Etiquetas_Totales = n_vertical × etq_eje_horizontal
     if 'n_vertical' in df_resumen.columns and 'etq_eje_horizontal' in df_resumen.columns:
-        df_resumen['Etiquetas_Totales'] = (df_resumen['n_vertical'] * df_resumen['etq_eje_horizontal'])
+        columnas_derivadas['Etiquetas_Totales'] = df_resumen['n_vertical'] * df_resumen['etq_eje_horizontal']
+    
+    df_resumen = df_resumen.assign(**columnas_derivadas)
+    
+    # Mostrar resultado del Factor_unificado
+    if DEBUG_RESUMEN:
+        print("\n[DEBUG] RESULTADO - Factor_unificado calculado (NUEVA REGLA)")
+        print("─" * 100)
+        print(df_resumen[['Cantidad', 'Unidad_medida', 'Factor_unificado']].head(10).to_string())
+        print("─" * 100)
     
     # ═══════════════════════════════════════════════════════════════════════════════
     # NORMALIZAR STOCK SEGÚN UNIDAD_MEDIDA
@@ -612,93 +625,53 @@ def crear_tabla_resumen(df_pedidos_componentes_stock, df_pedidos_pendientes=None
     # - Si ROLLO: Stock × Factor_de_conversion (m² por rollo)
     # - Si MILES: Stock × Factor_unificado (factor normalizado)
     
-    print("\n[DEBUG] NORMALIZACIÓN DE STOCK POR UNIDAD_MEDIDA", flush=True)
-    print("─" * 100, flush=True)
-    
-    def normalizar_stock(row):
-        """
-        Normaliza el stock según la Unidad_Medida del componente:
-        - UNIDAD/UN/MILES/MIL/vacío → Stock × 1000 (convertir a base)
-        - ROLLO/ROLLOS → Stock × Factor_unificado (usar factor de conversión)
-        """
-        stock_original = row['StockAcumulado']
-        unidad = str(row.get('Unidad_medida', '')).strip().upper()
-        
-        # Si es UNIDAD/UN, MILES/MIL o está vacío → multiplicar por 1000
-        if unidad in ['UNIDAD', 'UN', 'UNI', 'MILES', 'MIL', 'MILE', '']:
-            return stock_original * 1000
-        
-        # Si es ROLLO/ROLLOS → usar Factor_unificado (m² por rollo)
-        elif unidad in ['ROLLO', 'ROLLOS', 'ROL', 'ROLOS']:
-            factor_rollo = row.get('Factor_unificado', 1)
-            return stock_original * factor_rollo
-        
-        # Por defecto → asumir MILES y multiplicar por 1000
-        else:
-            return stock_original * 1000
-    
-    df_resumen['StockAcumulado'] = df_resumen.apply(normalizar_stock, axis=1)
+    if DEBUG_RESUMEN:
+        print("\n[DEBUG] NORMALIZACIÓN DE STOCK POR UNIDAD_MEDIDA")
+        print("─" * 100)
+    
+    # - UNIDAD/UN/MILES/MIL/vacío → Stock × 1000 (convertir a base)
+    # - ROLLO/ROLLOS → Stock × Factor_unificado (usar factor de conversión)
+    # - Por defecto → asumir MILES y multiplicar por 1000
+    es_rollo = unidad_en(df_resumen['Unidad_medida'], ['ROLLO', 'ROLLOS', 'ROL', 'ROLOS'])
+    df_resumen['StockAcumulado'] = np.where(
+        es_rollo,
+        df_resumen['StockAcumulado'] * df_resumen['Factor_unificado'],
+        df_resumen['StockAcumulado'] * 1000
+    )
     
     print("  ✓ Stock normalizado según Unidad_Medida", flush=True)
-    print(df_resumen[['Componente', 'Unidad_medida', 'Factor_unificado', 'StockAcumulado']].drop_duplicates(subset=['Componente']).head(10).to_string(), flush=True)
-    print("─" * 100, flush=True)
+    if DEBUG_RESUMEN:
+        print(df_resumen[['Componente', 'Unidad_medida', 'Factor_unificado', 'StockAcumulado']].drop_duplicates(subset=['Componente']).head(10).to_string())
+        print("─" * 100)
     
     # ═══════════════════════════════════════════════════════════════════════════════
     # CASCADEO DUAL DE STOCK - DOS LÓGICAS PARALELAS
     # ═══════════════════════════════════════════════════════════════════════════════
     
-    # Guardar ANTES de modificar: Stock_Acumulado original (de BD, ya normalizado)
-    df_resumen['Stock_Acumulado_Original'] = df_resumen['StockAcumulado'].copy()
-    
-    # Inicializar columnas para cascadeo
-    df_resumen['Stock_Acumulado_Cascada'] = 0.0        # Para fórmula tradicional (izquierda)
-    df_resumen['Stock_Acumulado_Factor_Cascada'] = 0.0 # Para factor (derecha)
-    df_resumen['Stock_Final_m2'] = 0.0                 # Resultado lado izquierdo
-    df_resumen['Stock_Final_Factor'] = 0.0             # Resultado lado derecho
-    
-    componente_anterior = None
-    stock_tradicional = 0.0      # Para lado izquierdo (Motor)
-    stock_factor = 0.0           # Para lado derecho (Factor)
-    
-    for idx in df_resumen.index:
-        componente_actual = df_resumen.at[idx, 'Componente']
-        
-        # Si cambió el componente, reiniciar con los Stock_Acumulado originales (de BD)
-        if componente_actual != componente_anterior:
-            stock_original = df_resumen.at[idx, 'Stock_Acumulado_Original']
-            stock_tradicional = stock_original
-            stock_factor = stock_original
-            componente_anterior = componente_actual
-        
-        # ───────────────────────────────────────────────────────────────────────────
-        # LADO IZQUIERDO: FÓRMULA TRADICIONAL (Motor - Metros con Merma)
-        # ───────────────────────────────────────────────────────────────────────────
-        df_resumen.at[idx, 'Stock_Acumulado_Cascada'] = stock_tradicional
-        metros_merma = df_resumen.at[idx, 'Metros_Cuadrados_Con_Merma']
-        stock_final_m2 = stock_tradicional - metros_merma
-        df_resumen.at[idx, 'Stock_Final_m2'] = stock_final_m2
-        
-        # Actualizar stock para la siguiente fila (usando stock final m2)
-        stock_tradicional = stock_final_m2
-        
-        # ───────────────────────────────────────────────────────────────────────────
-        # LADO DERECHO: CÁLCULOS POR FACTOR (Metros Factor)
-        # ───────────────────────────────────────────────────────────────────────────
-        df_resumen.at[idx, 'Stock_Acumulado_Factor_Cascada'] = stock_factor
-        metros_factor = df_resumen.at[idx, 'Metros_Cuadrados_Factor']
-        stock_final_factor = stock_factor - metros_factor
-        df_resumen.at[idx, 'Stock_Final_Factor'] = stock_final_factor
-        
-        # Actualizar stock para la siguiente fila (usando stock final factor)
-        stock_factor = stock_final_factor
-    
-    # Asignar valores cascadeados al Stock_Acumulado (para lado izquierdo)
-    df_resumen['StockAcumulado'] = df_resumen['Stock_Acumulado_Cascada']
-    df_resumen = df_resumen.drop(columns=['Stock_Acumulado_Cascada'])
+    # Si cambió el componente, reiniciar con los Stock_Acumulado originales (de BD).
+    # Se compara con != de Python elemento a elemento (arreglo object), igual que
+    # el recorrido fila a fila: NaN siempre reinicia y la primera fila se compara con None
+    componentes = df_resumen['Componente'].to_numpy(dtype=object)
+    componente_anterior = np.empty_like(componentes)
+    componente_anterior[0:1] = None
+    componente_anterior[1:] = componentes[:-1]
+    reinicio = np.asarray(componentes != componente_anterior, dtype=np.bool_)
+    
+    # Con Numba, el kernel fila a fila; sin Numba, restas acumuladas por componente
+    cascadear = _cascadear_stock if NUMBA_DISPONIBLE else _cascadear_stock_por_grupo
+    stock_acumulado, stock_final_m2, stock_acumulado_factor, stock_final_factor = cascadear(
+        reinicio,
+        df_resumen['StockAcumulado'].to_numpy(dtype=np.float64),
+        df_resumen['Metros_Cuadrados_Con_Merma'].to_numpy(dtype=np.float64),
+        df_resumen['Metros_Cuadrados_Factor'].to_numpy(dtype=np.float64)
+    )
     
-    # Crear Stock_Acumulado_Factor (para lado derecho)
-    df_resumen['Stock_Acumulado_Factor'] = df_resumen['Stock_Acumulado_Factor_Cascada']
-    df_resumen = df_resumen.drop(columns=['Stock_Acumulado_Factor_Cascada', 'Stock_Acumulado_Original'])
+    # Lado izquierdo (Motor - Metros con Merma): Stock_Acumulado cascadeado y Stock_Final_m2
+    df_resumen['StockAcumulado'] = stock_acumulado
+    df_resumen['Stock_Final_m2'] = stock_final_m2
+    # Lado derecho (Factor): Stock_Final_Factor y Stock_Acumulado_Factor
+    df_resumen['Stock_Final_Factor'] = stock_final_factor
+    df_resumen['Stock_Acumulado_Factor'] = stock_acumulado_factor
     
     # Calcular Indicador_Factor: 1 si Stock_Final_Factor > 0, else 0 (booleano)
     df_resumen['Indicador_Factor'] = (df_resumen['Stock_Final_Factor'] > 0).astype(bool)
@@ -841,29 +814,37 @@ def crear_tabla_resumen(df_pedidos_componentes_stock, df_pedidos_pendientes=None
         'Indicador_Factor'          # Booleano: ¿hay stock final?
     ]
     
-    # Permitir columnas duplicadas para mostrar ambos lados (Motor + Factor)
-    # Validar que todas las columnas en orden_deseado existan, filtrar solo las que existen
+    # Validar que todas las columnas en orden_deseado existan, filtrar solo las que existen.
+    # Las marcadas (DUPLICADO) no se repiten en el DataFrame: un nombre de columna
+    # es único, así que quedan en su primera posición
     columnas_existentes = set(df_resumen.columns)
-    orden_final = [col for col in orden_deseado if col in columnas_existentes]
+    orden_final = list(dict.fromkeys(col for col in orden_deseado if col in columnas_existentes))
     
     # Agregar cualquier columna restante que no esté en orden_final
-    columnas_restantes = [col for col in df_resumen.columns if col not in columnas_existentes or 
-                          col not in set(orden_deseado)]
-    
-    # Crear nueva tabla con columnas en el orden deseado (permitiendo duplicados)
-    df_resumen_ordenado = pd.DataFrame()
-    for col in orden_final:
-        df_resumen_ordenado[col] = df_resumen[col]
-    
-    # Agregar columnas restantes
-    for col in columnas_restantes:
-        if col not in df_resumen_ordenado.columns:
-            df_resumen_ordenado[col] = df_resumen[col]
+    columnas_ordenadas = set(orden_final)
+    orden_final += [col for col in df_resumen.columns if col not in columnas_ordenadas]
     
-    df_resumen = df_resumen_ordenado
+    # Reordenar en un solo paso, sin copiar columna por columna
+    df_resumen = df_resumen.reindex(columns=orden_final)
     
     return df_resumen
 
+# =====================================================================
+# FUNCIÓN: LECTURA DE SQL POR BLOQUES
+# =====================================================================
+def leer_sql_por_bloques(query, engine, chunksize=10_000):
+    """
+    Lee una consulta en bloques de chunksize filas y los une en un DataFrame.
+    
+    Evita materializar todo el resultado de pyodbc de una sola vez. Un bloque
+    con una columna completamente nula la deja como object; infer_objects
+    recupera el tipo que tendría la lectura de una sola vez.
+    """
+    bloques = list(pd.read_sql(query, engine, chunksize=chunksize))
+    if len(bloques) == 1:
+        return bloques[0]
+    return pd.concat(bloques, ignore_index=True).infer_objects()
+
 # Configuración de conexión a SQL Server
 server = '10.101.2.181'
 database = 'SAP_G02E05_Innoprint'
@@ -892,9 +873,9 @@ try:
         pool_size=5,
         max_overflow=10,
         pool_recycle=3600,  # Reciclar conexiones cada hora
+        # fast_executemany solo acelera escrituras (executemany); aquí solo hay SELECT
         connect_args={
             'timeout': 30,  # Timeout de conexión: 30 segundos
-            'fast_executemany': True,  # Ejecutar múltiples comandos rápidamente
         },
         echo=False
     )
@@ -903,6 +884,10 @@ try:
     print("[INFO] Conectando a SQL Server y ejecutando SELECT FROM vista_stock_General...", flush=True)
     
     # OPTIMIZACIÓN: Query mejorada con índices y filtros más específicos
+    # NOTA: se mantiene SELECT * porque df_stock se exporta completo a la hoja
+    # StockGeneral. Los LIKE con % inicial no usan índice; para convertir el
+    # scan en seek haría falta una columna indicadora indexada en las tablas
+    # base de la vista (cambio de esquema en SQL Server, fuera de este script).
     query = """
     SELECT TOP 50000 * 
     FROM dbo.vista_stock_General AS stock 
@@ -910,7 +895,7 @@ try:
        OR ItemName LIKE '%LAMINADO%'
     """
     
-    df_stock = pd.read_sql(query, engine)
+    df_stock = leer_sql_por_bloques(query, engine)
     print(f"[OK] Datos de stock cargados ✓ ({len(df_stock)} registros)", flush=True)
 
     print("[INFO] Cargando lista de materiales...", flush=True)
@@ -939,7 +924,7 @@ try:
     ORDER BY Cantidad DESC
     """
     print("[DEBUG] Ejecutando query de lista de materiales...", flush=True)
-    df_listademateriales = pd.read_sql(query_listademateriales, engine)
+    df_listademateriales = leer_sql_por_bloques(query_listademateriales, engine)
     print(f"[OK] Lista de materiales cargada ({len(df_listademateriales)} registros) ✓", flush=True)
     df_listademateriales['Primer_palabra_componente'] = df_listademateriales['Nomb_componente'].str.split(' ').str[0]
     df_listademateriales['Union_palabra_padre'] = df_listademateriales['Prod_padre'].astype(str) + df_listademateriales['Primer_palabra_componente']
@@ -956,61 +941,46 @@ try:
         how='left'
     )
     
-    # Función para calcular Stock_Final según Unidad_Medida
-    def calcular_stock_final(row):
-        """
-        Calcula Stock_Final respetando la Unidad_Medida:
-        - Si UNIDAD/UN: Stock × 1000 (convertir a base)
-        - Si MILES/MIL: Stock × 1000 (MILES implica que está en miles, hay que expandir)
-        - Si ROLLO/ROLLOS: mantener igual (el stock está en rollos, unidad especial)
-        - Si está vacío: asumir MILES y multiplicar × 1000
-        """
-        cantidad = row.get('Cantidad', 0)
-        unidad = str(row.get('Unidad_medida', '')).strip().upper()
-        
-        # Si es UNIDAD/UN, MILES/MIL o está vacío → multiplicar por 1000
-        if unidad in ['UNIDAD', 'UN', 'UNI', 'MILES', 'MIL', 'MILE', '']:
-            # Todos estos casos se multiplican por 1000 para convertir a la unidad base
-            return cantidad * 1000
-        
-        # Normalizar variaciones de "ROLLO" → mantener igual
-        elif unidad in ['ROLLO', 'ROLLOS', 'ROL', 'ROLOS']:
-            # Si es ROLLO/ROLLOS, mantener igual (el stock está en rollos)
-            return cantidad
-        
-        else:
-            # Por defecto (cualquier otra cosa), asumir MILES y multiplicar por 1000
-            return cantidad * 1000
-    
-    print("\n[DEBUG] CALCULANDO STOCK_FINAL EN DF_STOCK", flush=True)
-    print("─" * 100, flush=True)
-    
-    df_stock_con_unidad['Stock_Final'] = df_stock_con_unidad.apply(calcular_stock_final, axis=1)
+    if DEBUG_RESUMEN:
+        print("\n[DEBUG] CALCULANDO STOCK_FINAL EN DF_STOCK")
+        print("─" * 100)
+    
+    # Calcular Stock_Final respetando la Unidad_Medida:
+    # - Si UNIDAD/UN, MILES/MIL o está vacío: Stock × 1000 (convertir a base)
+    # - Si ROLLO/ROLLOS: mantener igual (el stock está en rollos, unidad especial)
+    # - Por defecto (cualquier otra cosa): asumir MILES y multiplicar × 1000
+    cantidad_stock = df_stock_con_unidad.get('Cantidad', 0)
+    df_stock_con_unidad['Stock_Final'] = np.where(
+        unidad_en(df_stock_con_unidad['Unidad_medida'], ['ROLLO', 'ROLLOS', 'ROL', 'ROLOS']),
+        cantidad_stock,
+        cantidad_stock * 1000
+    )
     
     print("  ✓ Stock_Final calculado según Unidad_Medida", flush=True)
-    print(df_stock_con_unidad[['ItemCode', 'Unidad_medida', 'Cantidad', 'Stock_Final']].drop_duplicates(subset=['ItemCode']).head(10).to_string(), flush=True)
-    print("─" * 100, flush=True)
+    if DEBUG_RESUMEN:
+        print(df_stock_con_unidad[['ItemCode', 'Unidad_medida', 'Cantidad', 'Stock_Final']].drop_duplicates(subset=['ItemCode']).head(10).to_string())
+        print("─" * 100)
     
     # Actualizar df_stock con la nueva columna (usar Stock_Final en lugar de Cantidad)
-    df_stock = df_stock_con_unidad.copy()
+    # (df_stock_con_unidad no se vuelve a usar, basta con reasignar sin copiar)
+    df_stock = df_stock_con_unidad
 
     print("[INFO] Cargando pedidos pendientes...", flush=True)
     try:
         query_pedidos_pendientes = "SELECT * FROM SAP_G02E05_Innoprint.dbo.Vista_pedidos_pendientes"
-        # Intentar cargar con timeout de 120 segundos (más generoso)
-        df_pedidos_pendientes = pd.read_sql(query_pedidos_pendientes, engine, timeout=120)
+        # Lectura por bloques como stock y lista de materiales. pd.read_sql no
+        # tiene parámetro timeout: el límite de conexión es el de connect_args
+        df_pedidos_pendientes = leer_sql_por_bloques(query_pedidos_pendientes, engine)
         print("[OK] Pedidos pendientes cargados", flush=True)
     except Exception as e:
         print(f"[ADVERTENCIA] No se pudieron cargar pedidos pendientes: {e}", flush=True)
         print("[INFO] Continuando con DataFrame vacío...", flush=True)
         df_pedidos_pendientes = pd.DataFrame()  # DataFrame vacío para evitar que se cuelgue
     # --- EXTRAER MEDIDAS DE ETIQUETA ---
-    import re
-    
     # Función mejorada para extraer medidas que maneja puntos iniciales errados
-    def extraer_medidas_stock(articulo):
+    def extraer_medidas_stock(articulos):
         """
-        Extrae medidas de etiqueta del nombre del artículo.
+        Extrae medidas de etiqueta del nombre del artículo, vectorizado sobre la columna.
         Maneja casos como ".219.5" ignorando puntos iniciales errados.
         
         Busca patrones:
@@ -1018,50 +988,46 @@ try:
         - Una medida: 170 MM, 170mm, .170.5 MM, etc.
         
         Returns:
-            Series([alto, ancho]) o Series([0, 0]) si no encuentra
+            DataFrame con columnas [alto, ancho]; 0 donde no encuentra medidas
+            o el valor no es texto
         """
-        if not isinstance(articulo, str):
-            return pd.Series([0, 0])
+        # Se trabaja sobre object para usar el motor `re` de Python en todas las
+        # operaciones (mismas clases \d, \s y \b que la versión por fila); los
+        # valores que no son texto quedan en NaN y terminan en 0
+        articulos = articulos.astype(object)
         
         # Limpiar puntos iniciales errados: ".219.5" → "219.5"
         # Caso 1: Punto inicial al comienzo
-        articulo_limpio = re.sub(r'^\.(\d)', r'\1', articulo)
         # Caso 2: Punto inicial después de un espacio
-        articulo_limpio = re.sub(r'(\s)\.(\d)', r'\1\2', articulo_limpio)
-        
-        # Primero busca el patrón con dos medidas: 55x66, 55,5 x 66,7, 55.5 X 66.7, .219.5x100, etc.
-        match_dos_medidas = re.search(r'([\d,\.]+)\s*[xX]\s*([\d,\.]+)', articulo_limpio)
-        if match_dos_medidas:
-            try:
-                # Convertir comas a puntos
-                alto_str = match_dos_medidas.group(1).replace(',', '.')
-                ancho_str = match_dos_medidas.group(2).replace(',', '.')
-                
-                # Limpiar puntos múltiples al inicio: ".219.5" → "219.5"
-                alto_str = re.sub(r'^\.+', '', alto_str)
-                ancho_str = re.sub(r'^\.+', '', ancho_str)
-                
-                alto = float(alto_str)
-                ancho = float(ancho_str)
-                return pd.Series([alto, ancho])
-            except ValueError:
-                pass  # Si falla, intentar con una medida
+        articulos_limpios = (
+            articulos.str.replace(_PATRON_PUNTO_INICIAL, r'\1', regex=True)
+            .str.replace(_PATRON_PUNTO_TRAS_ESPACIO, r'\1\2', regex=True)
+        )
         
-        # Si no encuentra dos medidas, busca una sola medida acompañada de MM
-        # Patrones: "170 MM", "170MM", "170 mm", "170mm", ".170.5 MM", etc.
-        match_una_medida = re.search(r'([\d,\.]+)\s*(?:mm|MM|Mm|mM)\b', articulo_limpio, re.IGNORECASE)
-        if match_una_medida:
-            try:
-                medida_str = match_una_medida.group(1).replace(',', '.')
-                # Limpiar puntos iniciales
-                medida_str = re.sub(r'^\.+', '', medida_str)
-                medida = float(medida_str)
-                # Si encuentra una sola medida con MM, asume que alto y ancho son iguales
-                return pd.Series([medida, medida])
-            except ValueError:
-                pass
+        def a_numero(medidas):
+            # Comas a puntos y sin puntos al inicio; lo que no sea número queda NaN.
+            # Solo se convierten los textos que float() acepta (dígitos con a lo sumo
+            # un punto) y la conversión la hace float() mismo, sin redondeos distintos
+            medidas = medidas.str.replace(',', '.', regex=False).str.lstrip('.')
+            validas = medidas.str.fullmatch(_PATRON_NUMERO).fillna(False).to_numpy(dtype=bool)
+            numeros = np.full(len(medidas), np.nan)
+            numeros[validas] = medidas.to_numpy(dtype=object)[validas].astype(float)
+            return pd.Series(numeros, index=medidas.index)
         
-        return pd.Series([0, 0])
+        # Primero busca el patrón con dos medidas: 55x66, 55,5 x 66,7, 55.5 X 66.7, .219.5x100, etc.
+        dos_medidas = articulos_limpios.str.extract(_PATRON_DOS_MEDIDAS)
+        alto = a_numero(dos_medidas[0])
+        ancho = a_numero(dos_medidas[1])
+        
+        # Si no hay dos medidas válidas, busca una sola medida acompañada de MM
+        # y asume que alto y ancho son iguales
+        sin_dos = alto.isna() | ancho.isna()
+        if sin_dos.any():
+            medida = a_numero(articulos_limpios[sin_dos].str.extract(_PATRON_UNA_MEDIDA)[0])
+            alto = alto.where(~sin_dos, medida)
+            ancho = ancho.where(~sin_dos, medida)
+        
+        return pd.DataFrame({0: alto, 1: ancho}).fillna(0)
 
     # Crear la tabla stock acumulado
     df_stock_acumulado = (
@@ -1081,19 +1047,26 @@ try:
         df_stock_acumulado['StockAcumulado'] = df_stock_acumulado['StockAcumulado'].clip(lower=0)
     
     # Filtrar solo los que comienzan con 'LAMINADO' en ItemName, ignorando nulos
+    # (na=False los descarta sin armar una copia de la columna con fillna)
     df_stock_acumulado = df_stock_acumulado[
-        df_stock_acumulado['ItemName'].fillna('').str.startswith('LAMINADO')
+        df_stock_acumulado['ItemName'].str.startswith('LAMINADO', na=False)
     ]
 
     # Agregar columna con todas las fechas de compra (FechAdmis) concatenadas por ItemCode
+    # Las fechas se convierten y formatean una sola vez para toda la columna;
+    # por grupo solo queda unir los textos
+    laminados = df_stock[df_stock['ItemName'].str.startswith('LAMINADO', na=False)]
+    fechas = laminados['FechAdmis'].dropna()
     fechas_por_item = (
-        df_stock[df_stock['ItemName'].fillna('').str.startswith('LAMINADO')]
-        .groupby('ItemCode')['FechAdmis']
-        .apply(lambda fechas: ' - '.join(pd.to_datetime(fechas.dropna()).dt.strftime('%d-%m-%Y')))
-        .reset_index()
-        .rename(columns={'FechAdmis': 'FechasCompra'})
+        pd.to_datetime(fechas).dt.strftime('%d-%m-%Y')
+        .groupby(laminados.loc[fechas.index, 'ItemCode'])
+        .agg(' - '.join)
     )
-    df_stock_acumulado = df_stock_acumulado.merge(fechas_por_item, on='ItemCode', how='left')
+    # El groupby deja un ItemCode por fila: un map equivale al merge left, sin
+    # armar el frame combinado ni revisar claves repetidas. Los LAMINADO sin
+    # ninguna fecha no quedan en fechas_por_item y llevan texto vacío
+    df_stock_acumulado = df_stock_acumulado.reset_index(drop=True)
+    df_stock_acumulado['FechasCompra'] = df_stock_acumulado['ItemCode'].map(fechas_por_item).fillna('')
 
     # Si el stock acumulado es 0, poner la fecha actual en FechasCompra
     fecha_actual = pd.Timestamp.now().strftime('%d-%m-%Y')
@@ -1102,9 +1075,15 @@ try:
     # --- NUEVO: Left join entre pedidos pendientes y lista de materiales ---
     # Asumimos que la columna de código en pedidos pendientes se llama 'Codigo'
     # Si tiene otro nombre, reemplaza 'Codigo' por el nombre correcto
+    # Solo interesan componentes 'LAMINADO' (paso 2): se filtra la lista de
+    # materiales antes del merge para no generar filas que luego se descartan
+    componentes_laminado = df_listademateriales.loc[
+        df_listademateriales['Nomb_componente'].str.startswith('LAMINADO', na=False),
+        ['Prod_padre', 'Componente', 'Nomb_componente']
+    ]
     df_pedidos_con_componentes = pd.merge(
         df_pedidos_pendientes,
-        df_listademateriales[['Prod_padre', 'Componente', 'Nomb_componente']],
+        componentes_laminado,
         left_on='Codigo',  # Cambia 'Codigo' si el nombre es diferente
         right_on='Prod_padre',
         how='left'
@@ -1112,83 +1091,42 @@ try:
 
     # --- Procesamiento paso a paso de df_pedidos_componentes_stock ---
     # 1. Merge con stock acumulado
-    df_pedidos_componentes_stock = pd.merge(
-        df_pedidos_con_componentes,
-        df_stock_acumulado[['ItemCode', 'StockAcumulado']],
-        left_on='Componente',
-        right_on='ItemCode',
-        how='left'
-    )
-    df_pedidos_componentes_stock = df_pedidos_componentes_stock.drop(columns=['ItemCode'])
+    # Con un ItemCode por fila basta un map (sin frame combinado ni columna
+    # ItemCode que descartar); si un ItemCode aparece con varios nombres o
+    # categorías se mantiene el merge, que genera una fila por cada uno
+    stock_por_item = df_stock_acumulado[['ItemCode', 'StockAcumulado']]
+    if stock_por_item['ItemCode'].is_unique:
+        df_pedidos_componentes_stock = df_pedidos_con_componentes
+        df_pedidos_componentes_stock['StockAcumulado'] = df_pedidos_componentes_stock['Componente'].map(
+            stock_por_item.set_index('ItemCode')['StockAcumulado']
+        )
+    else:
+        df_pedidos_componentes_stock = pd.merge(
+            df_pedidos_con_componentes,
+            stock_por_item,
+            left_on='Componente',
+            right_on='ItemCode',
+            how='left'
+        )
+        df_pedidos_componentes_stock = df_pedidos_componentes_stock.drop(columns=['ItemCode'])
 
     # 2. Filtrar solo componentes que empiezan por 'LAMINADO'
+    # (la lista de materiales ya viene filtrada; aquí solo quedan por descartar
+    # los pedidos sin ningún componente LAMINADO, que el merge left deja en nulo)
     df_pedidos_componentes_stock = df_pedidos_componentes_stock[
-        df_pedidos_componentes_stock['Nomb_componente'].fillna('').str.startswith('LAMINADO')
+        df_pedidos_componentes_stock['Nomb_componente'].str.startswith('LAMINADO', na=False)
     ]
 
     # 3. Limpiar nulos y convertir a float
-    df_pedidos_componentes_stock['StockAcumulado'] = df_pedidos_componentes_stock['StockAcumulado'].fillna(0).astype(float)
-    df_pedidos_componentes_stock['Pendiente'] = df_pedidos_componentes_stock['Pendiente'].fillna(0).astype(float)
+    # (to_numpy con na_value hace ambas cosas en una sola asignación, sin la copia intermedia de fillna)
+    for columna in ['StockAcumulado', 'Pendiente']:
+        df_pedidos_componentes_stock[columna] = df_pedidos_componentes_stock[columna].to_numpy(dtype=np.float64, na_value=0.0)
 
     # 4. Extraer medidas de etiqueta
     posibles_col = ["nombre_articulo", "Nombre_articulo", "Nombre_Articulo", "articulo", "Articulo", "NOMBRE_ARTICULO"]
     col_medidas = next((col for col in posibles_col if col in df_pedidos_componentes_stock.columns), None)
-    def extraer_medidas_stock(articulo):
-        """
-        Extrae medidas de etiqueta del nombre del artículo.
-        Maneja casos como ".219.5" ignorando puntos iniciales errados.
-        
-        Busca patrones:
-        - Dos medidas: 55x66, 55,5 x 66,7, .219.5x100 (ignora primer punto)
-        - Una medida: 170 MM, 170mm, .170.5 MM, etc.
-        
-        Returns:
-            Series([alto, ancho]) o Series([0, 0]) si no encuentra
-        """
-        if not isinstance(articulo, str):
-            return pd.Series([0, 0])
-        
-        # Limpiar puntos iniciales errados: ".219.5" → "219.5"
-        # Caso 1: Punto inicial al comienzo
-        articulo_limpio = re.sub(r'^\.(\d)', r'\1', articulo)
-        # Caso 2: Punto inicial después de un espacio
-        articulo_limpio = re.sub(r'(\s)\.(\d)', r'\1\2', articulo_limpio)
-        
-        # Primero busca el patrón con dos medidas: 55x66, 55,5 x 66,7, 55.5 X 66.7, .219.5x100, etc.
-        match_dos_medidas = re.search(r'([\d,\.]+)\s*[xX]\s*([\d,\.]+)', articulo_limpio)
-        if match_dos_medidas:
-            try:
-                # Convertir comas a puntos
-                alto_str = match_dos_medidas.group(1).replace(',', '.')
-                ancho_str = match_dos_medidas.group(2).replace(',', '.')
-                
-                # Limpiar puntos múltiples al inicio: ".219.5" → "219.5"
-                alto_str = re.sub(r'^\.+', '', alto_str)
-                ancho_str = re.sub(r'^\.+', '', ancho_str)
-                
-                alto = float(alto_str)
-                ancho = float(ancho_str)
-                return pd.Series([alto, ancho])
-            except ValueError:
-                pass  # Si falla, intentar con una medida
-        
-        # Si no encuentra dos medidas, busca una sola medida acompañada de MM
-        # Patrones: "170 MM", "170MM", "170 mm", "170mm", ".170.5 MM", etc.
-        match_una_medida = re.search(r'([\d,\.]+)\s*(?:mm|MM|Mm|mM)\b', articulo_limpio, re.IGNORECASE)
-        if match_una_medida:
-            try:
-                medida_str = match_una_medida.group(1).replace(',', '.')
-                # Limpiar puntos iniciales
-                medida_str = re.sub(r'^\.+', '', medida_str)
-                medida = float(medida_str)
-                # Si encuentra una sola medida con MM, asume que alto y ancho son iguales
-                return pd.Series([medida, medida])
-            except ValueError:
-                pass
-        
-        return pd.Series([0, 0])
     if col_medidas:
-        df_pedidos_componentes_stock[['Etiqueta_Alto', 'Etiqueta_Ancho']] = df_pedidos_componentes_stock[col_medidas].apply(extraer_medidas_stock)
+        df_pedidos_componentes_stock[['Etiqueta_Alto', 'Etiqueta_Ancho']] = extraer_medidas_stock(df_pedidos_componentes_stock[col_medidas]).to_numpy()
     if 'Etiqueta_Alto' not in df_pedidos_componentes_stock.columns:
         df_pedidos_componentes_stock['Etiqueta_Alto'] = 0
     if 'Etiqueta_Ancho' not in df_pedidos_componentes_stock.columns:
@@ -1196,149 +1134,91 @@ try:
 
     # 5. Calcular área en m2
     df_pedidos_componentes_stock['Etiqueta_m2'] = (
-        df_pedidos_componentes_stock['Etiqueta_Alto'].astype(float) * df_pedidos_componentes_stock['Etiqueta_Ancho'].astype(float)
+        df_pedidos_componentes_stock['Etiqueta_Alto'].to_numpy(dtype=np.float64)
+        * df_pedidos_componentes_stock['Etiqueta_Ancho'].to_numpy(dtype=np.float64)
     ) / 1_000_000
 
     # 5a. CREAR ETIQUETAS_A_PRODUCIR ANTES DEL MOTOR
     # Etiquetas_a_Producir = Pendiente x 1000 si UMInv es MILES, sino Pendiente
     if 'Etiquetas_a_Producir' not in df_pedidos_componentes_stock.columns:
-        df_pedidos_componentes_stock['Etiquetas_a_Producir'] = df_pedidos_componentes_stock.apply(
-            lambda row: (row['Pendiente'] * 1000 
-                        if str(row.get('UMInv', '')).strip().upper() in ['MILES', 'MIL', 'MILE']
-                        else row['Pendiente']),
-            axis=1
-        )
+        pendiente = df_pedidos_componentes_stock['Pendiente']
+        if 'UMInv' in df_pedidos_componentes_stock.columns:
+            en_miles = unidad_en(df_pedidos_componentes_stock['UMInv'], ['MILES', 'MIL', 'MILE'])
+            df_pedidos_componentes_stock['Etiquetas_a_Producir'] = np.where(en_miles, pendiente * 1000, pendiente)
+        else:
+            df_pedidos_componentes_stock['Etiquetas_a_Producir'] = pendiente
 
     # 5b. MOTOR DE CALCULO: Obtener Z sugerido, metraje ML y M2
     print("Ejecutando motor de cálculo para obtener Z sugerido y metraje...", flush=True)
     
-    # Lista para rastrear impossibilidades técnicas
-    imposibilidades_tecnicas = []
-    
-    def calcular_z_y_metraje(row):
-        """Calcula Z sugerido, ML y M2 para cada componente"""
-        alto = row['Etiqueta_Alto']
-        ancho = row['Etiqueta_Ancho']
-        # CAMBIO CRITICO: Usar Etiquetas_a_Producir en lugar de Pendiente
-        # Etiquetas_a_Producir se crea ANTES en la linea ~1205
-        etiquetas_a_producir = row['Etiquetas_a_Producir']
-        nombre_componente = row.get('Nomb_componente', '')
-        codigo = row.get('Codigo', '')
-        
-        # Extraer ancho del rollo desde Nombre_Componente
-        ancho_rollo = extraer_ancho_rollo_mm(nombre_componente)
-        if ancho_rollo is None:
-            ancho_rollo = ROLLO_BASE_MM  # Usar valor por defecto si no se encuentra
-        
-        # Si no tenemos medidas, retornar nulos
-        if not alto or not ancho:
-            return pd.Series({
-                'Z_Sugerido': None,
-                'Desarrollo_mm': None,
-                'gap_vertical': None,
-                'Ancho_rollo_mm': ancho_rollo,
-                'n_vertical': None,
-                'gap_horizontal_real': None,
-                'etq_eje_horizontal': None,
-                'Etiquetas_repeticion': None,
-                'Repeticiones': None,
-                'Merma_mm': None,
-                'Merma_m': None,
-                'ML_sin_merma': None,
-                'M2_sin_merma': None,
-                'motivo_imposibilidad': 'SIN MEDIDAS'
-            })
-        
-        # Si Etiquetas_a_Producir es 0, usar 1 como valor minimo para poder calcular Z
-        # (asi sabemos que cilindro se necesitaria aunque no haya cantidad pedida)
-        unidades_para_calculo = max(1, int(etiquetas_a_producir)) if etiquetas_a_producir > 0 else 1
-        
-        # Obtener Z óptimo (pasando ancho_rollo extraído)
-        resultado_z = obtener_z_sugerido(alto, ancho, unidades_para_calculo, ancho_rollo_mm=ancho_rollo)
-        
-        if resultado_z is None:
-            # Completamente imposible
-            return pd.Series({
-                'Z_Sugerido': None,
-                'Desarrollo_mm': None,
-                'gap_vertical': None,
-                'Ancho_rollo_mm': ancho_rollo,
-                'n_vertical': None,
-                'gap_horizontal_real': None,
-                'etq_eje_horizontal': None,
-                'Etiquetas_repeticion': None,
-                'Repeticiones': None,
-                'Merma_mm': None,
-                'Merma_m': None,
-                'ML_sin_merma': None,
-                'M2_sin_merma': None,
-                'motivo_imposibilidad': f'IMPOSIBLE: Etiqueta {int(alto)}x{int(ancho)}mm no cabe en ningun rollo disponible'
-            })
-        
-        # Verificar si es técnicamente imposible (es_valido=False)
-        if resultado_z.get('es_valido') == False:
-            # Guardar en lista de impossibilidades
-            motivo = resultado_z.get('motivo_imposibilidad', 'Imposibilidad tecnica desconocida')
-            imposibilidades_tecnicas.append({
-                'Codigo': codigo,
-                'Componente': nombre_componente,
-                'Alto_mm': int(alto),
-                'Ancho_mm': int(ancho),
-                'Z_Asignado': resultado_z.get('z'),
-                'Rollo_mm': int(resultado_z.get('ancho_rollo_mm', 0)),
-                'Motivo': motivo
-            })
-            
-            # Retornar con rollo y Z pero GAP de 0
-            return pd.Series({
-                'Z_Sugerido': resultado_z.get('z'),
-                'Desarrollo_mm': None,
-                'gap_vertical': None,
-                'Ancho_rollo_mm': resultado_z.get('ancho_rollo_mm'),
-                'n_vertical': None,
-                'gap_horizontal_real': 0,  # GAP de 0 indica imposibilidad
-                'etq_eje_horizontal': None,
-                'Etiquetas_repeticion': None,
-                'Repeticiones': None,
-                'Merma_mm': None,
-                'Merma_m': None,
-                'ML_sin_merma': None,
-                'M2_sin_merma': None,
-                'motivo_imposibilidad': motivo
-            })
-        
-        # Cálculo exitoso
-        # Calcular merma (ajuste de 0.75 mm por repetición)
-        repeticiones = resultado_z.get('repeticiones', 0)
-        merma_total_mm = repeticiones * AJUSTE_DESARROLLO_REP_MM
-        etiquetas_por_rep = resultado_z.get('n', 0) * resultado_z.get('etq_eje', 0)
-        
-        # Calcular GAP horizontal real si es None
-        gap_horizontal_real = resultado_z.get('gap_horizontal_real')
-        if gap_horizontal_real is None and resultado_z.get('etq_eje', 0) == 1:
-            # Si cabe solo 1 etiqueta, calcular GAP como espacio a cada lado
-            rollo = resultado_z.get('ancho_rollo_mm', 0)
-            gap_horizontal_real = (rollo - ancho) / 2.0 if rollo > ancho else 0
-        
-        return pd.Series({
-            'Z_Sugerido': resultado_z.get('z'),
-            'Desarrollo_mm': round(resultado_z.get('desarrollo_mm', 0), 2),
-            'gap_vertical': round(resultado_z.get('gap_vertical', 0), 2) if resultado_z.get('gap_vertical') is not None else None,
-            'Ancho_rollo_mm': resultado_z.get('ancho_rollo_mm'),
-            'n_vertical': resultado_z.get('n'),
-            'gap_horizontal_real': round(gap_horizontal_real, 2) if gap_horizontal_real is not None else None,
-            'etq_eje_horizontal': resultado_z.get('etq_eje'),
-            'Etiquetas_repeticion': etiquetas_por_rep,
-            'Repeticiones': round(repeticiones, 2) if repeticiones else None,
-            'Merma_mm': round(merma_total_mm, 2),
-            'Merma_m': round(merma_total_mm / 1000, 4),
-            'ML_sin_merma': round(resultado_z.get('ml', 0), 2),
-            'M2_sin_merma': round(resultado_z.get('m2', 0), 2),
-            'motivo_imposibilidad': ""
-        })
-    
-    # Aplicar cálculo por fila
-    calculo_metraje = df_pedidos_componentes_stock.apply(calcular_z_y_metraje, axis=1)
+    df_calculo = df_pedidos_componentes_stock
+    alto = df_calculo['Etiqueta_Alto'].to_numpy(dtype=float)
+    ancho = df_calculo['Etiqueta_Ancho'].to_numpy(dtype=float)
+    # CAMBIO CRITICO: Usar Etiquetas_a_Producir en lugar de Pendiente
+    # Etiquetas_a_Producir se crea ANTES en el paso 5a
+    etiquetas_a_producir = df_calculo['Etiquetas_a_Producir'].to_numpy(dtype=float)
+    
+    # Extraer ancho del rollo desde Nombre_Componente (valor por defecto si no se encuentra)
+    ancho_rollo = extraer_ancho_rollo_mm_series(df_calculo['Nomb_componente']).fillna(ROLLO_BASE_MM).to_numpy()
+    
+    # Si Etiquetas_a_Producir es 0, usar 1 como valor minimo para poder calcular Z
+    # (asi sabemos que cilindro se necesitaria aunque no haya cantidad pedida)
+    unidades_para_calculo = np.maximum(1, np.where(etiquetas_a_producir > 0, etiquetas_a_producir, 1).astype(np.int64))
+    
+    # Obtener Z óptimo de todas las filas a la vez (pasando ancho_rollo extraído)
+    resultado_z = obtener_z_sugerido_batch(alto, ancho, unidades_para_calculo, ancho_rollo)
+    
+    # Clasificar filas: sin medidas, completamente imposibles, imposibilidad técnica o cálculo exitoso
+    sin_medidas = (alto == 0) | (ancho == 0)
+    imposible = resultado_z['sin_solucion'] & ~sin_medidas
+    es_valido = resultado_z['es_valido'] & ~sin_medidas
+    imposibilidad_tecnica = ~resultado_z['es_valido'] & ~resultado_z['sin_solucion'] & ~sin_medidas
+    
+    def redondear(valores, decimales):
+        """round() de Python por elemento: np.round difiere en algunos casos límite"""
+        return np.array([round(v, decimales) for v in valores.tolist()], dtype=float)
+    
+    def solo_validos(valores):
+        return np.where(es_valido, valores, np.nan)
+    
+    # Motivo por fila
+    motivo_imposibilidad = np.where(es_valido, "", resultado_z['motivo_imposibilidad'])
+    motivo_imposibilidad[sin_medidas] = 'SIN MEDIDAS'
+    for i in np.flatnonzero(imposible):
+        motivo_imposibilidad[i] = f'IMPOSIBLE: Etiqueta {int(alto[i])}x{int(ancho[i])}mm no cabe en ningun rollo disponible'
+    
+    # Calcular GAP horizontal real si es None: si cabe solo 1 etiqueta, espacio a cada lado
+    rollo = resultado_z['ancho_rollo_mm']
+    gap_horizontal_real = resultado_z['gap_horizontal_real']
+    gap_una_etiqueta = np.where(rollo > ancho, (rollo - ancho) / 2.0, 0.0)
+    gap_horizontal_real = np.where(np.isnan(gap_horizontal_real) & (resultado_z['etq_eje'] == 1),
+                                   gap_una_etiqueta, gap_horizontal_real)
+    
+    # Calcular merma (ajuste de 0.75 mm por repetición)
+    repeticiones = resultado_z['repeticiones']
+    merma_total_mm = repeticiones * AJUSTE_DESARROLLO_REP_MM
+    
+    calculo_metraje = pd.DataFrame({
+        'Z_Sugerido': np.where(sin_medidas, np.nan, resultado_z['z']),
+        'Desarrollo_mm': solo_validos(redondear(resultado_z['desarrollo_mm'], 2)),
+        'gap_vertical': solo_validos(redondear(resultado_z['gap_vertical'], 2)),
+        'Ancho_rollo_mm': np.where(sin_medidas, ancho_rollo, rollo),
+        'n_vertical': solo_validos(resultado_z['n']),
+        # GAP de 0 indica imposibilidad técnica
+        'gap_horizontal_real': np.where(imposibilidad_tecnica, 0.0, solo_validos(redondear(gap_horizontal_real, 2))),
+        'etq_eje_horizontal': solo_validos(resultado_z['etq_eje']),
+        'Etiquetas_repeticion': solo_validos(resultado_z['etq_repeat']),
+        'Repeticiones': solo_validos(redondear(repeticiones, 2)),
+        'Merma_mm': solo_validos(redondear(merma_total_mm, 2)),
+        'Merma_m': solo_validos(redondear(merma_total_mm / 1000, 4)),
+        'ML_sin_merma': solo_validos(redondear(resultado_z['ml'], 2)),
+        'M2_sin_merma': solo_validos(redondear(resultado_z['m2'], 2)),
+        'motivo_imposibilidad': motivo_imposibilidad
+    }, index=df_calculo.index, copy=False)
+    
+    # Unir columnas calculadas
+    # (los arreglos del motor ya son nuevos: copy=False arriba evita consolidarlos en
+    # otro bloque 2D, y con Copy-on-Write el concat no duplica las columnas existentes)
     df_pedidos_componentes_stock = pd.concat([df_pedidos_componentes_stock, calculo_metraje], axis=1)
 
     # 6. Calcular metros cuadrados pendientes (Etiqueta_m2 × Pendiente)
@@ -1472,101 +1352,107 @@ df_resumen = crear_tabla_resumen(
     df_listademateriales
 )
 
-# Usar RUTA_SALIDA para guardar en la carpeta del ejecutable o Descargas
-excel_filename = os.path.join(RUTA_SALIDA, 'tablas_unificadas.xlsx')
+# Usar ruta_salida() para guardar en la carpeta del ejecutable o Descargas
+excel_filename = os.path.join(ruta_salida(), 'tablas_unificadas.xlsx')
 
 # Función para aplicar colores condicionales a columnas de disponibilidad
-def aplicar_colores_disponibilidad(workbook_path, sheet_name='TablaResumen'):
+def aplicar_colores_disponibilidad(writer, df, sheet_name='TablaResumen'):
     """
     Aplica formato condicional de colores a las columnas Disponibilidad y Disponibilidad_Factor
     1 (verde), 0 (rojo)
+    
+    Se aplica sobre la hoja del ExcelWriter antes de que se guarde, así el
+    libro se escribe una sola vez (sin volver a abrirlo con load_workbook).
+    Las posiciones y valores se toman de df (el DataFrame escrito en la hoja)
+    en lugar de leer de vuelta las celdas.
     """
     try:
-        wb = load_workbook(workbook_path)
-        ws = wb[sheet_name]
+        ws = writer.sheets[sheet_name]
         
-        # Colores
-        verde = PatternFill(start_color="00B050", end_color="00B050", fill_type="solid")  # Verde
-        rojo = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")   # Rojo
+        # Colores en ARGB de 8 dígitos: openpyxl completa los de 6 con alfa 00
+        # ("00B050" → "0000B050", transparente), así que el alfa va explícito
+        verde = PatternFill(start_color="FF00B050", end_color="FF00B050", fill_type="solid")  # Verde
+        rojo = PatternFill(start_color="FFFF0000", end_color="FFFF0000", fill_type="solid")   # Rojo
         
         # Fuente blanca para mejor contraste
-        fuente_blanca = Font(color="FFFFFF", bold=True)
-        
-        # Buscar las columnas Disponibilidad y Disponibilidad_Factor
-        col_disponibilidad = None
-        col_disponibilidad_factor = None
+        fuente_blanca = Font(color="FFFFFFFF", bold=True)
+        centrado = Alignment(horizontal="center", vertical="center")
         
-        for cell in ws[1]:
-            if cell.value == 'Disponibilidad':
-                col_disponibilidad = cell.column
-            elif cell.value == 'Disponibilidad_Factor':
-                col_disponibilidad_factor = cell.column
-        
-        # Aplicar colores a Disponibilidad
-        if col_disponibilidad:
-            for row in range(2, ws.max_row + 1):
-                cell = ws.cell(row=row, column=col_disponibilidad)
-                if cell.value == 1:
-                    cell.fill = verde
-                    cell.font = fuente_blanca
-                elif cell.value == 0:
-                    cell.fill = rojo
-                    cell.font = fuente_blanca
-                cell.alignment = Alignment(horizontal="center", vertical="center")
+        # Columnas Disponibilidad y Disponibilidad_Factor (1-based en la hoja, sin índice)
+        columnas = {
+            columna: df.columns.get_loc(columna) + 1
+            for columna in ['Disponibilidad', 'Disponibilidad_Factor'] if columna in df.columns
+        }
         
-        # Aplicar colores a Disponibilidad_Factor
-        if col_disponibilidad_factor:
-            for row in range(2, ws.max_row + 1):
-                cell = ws.cell(row=row, column=col_disponibilidad_factor)
-                if cell.value == 1:
-                    cell.fill = verde
-                    cell.font = fuente_blanca
-                elif cell.value == 0:
-                    cell.fill = rojo
+        def filas_con_valor(columna, valor):
+            # Filas de la hoja (1 es el encabezado) donde la columna vale valor;
+            # nulos (NaN/NA) no son ni 1 ni 0
+            es_valor = df[columna].eq(valor).to_numpy(dtype=bool, na_value=False)
+            return (np.flatnonzero(es_valor) + 2).tolist()
+        
+        # Última fila de datos: se conoce por df, sin que iter_rows recorra la hoja
+        # (ws.max_row) para calcularla
+        ultima_fila = len(df) + 1
+        
+        # Todas las celdas de ambas columnas se centran en una sola pasada por fila
+        if columnas:
+            primera_col, ultima_col = min(columnas.values()), max(columnas.values())
+            posiciones = [col - primera_col for col in columnas.values()]
+            for fila in ws.iter_rows(min_row=2, max_row=ultima_fila, min_col=primera_col, max_col=ultima_col):
+                for posicion in posiciones:
+                    fila[posicion].alignment = centrado
+        
+        # Solo las filas con 1 (verde) o 0 (rojo) llevan relleno
+        for columna, col in columnas.items():
+            for relleno, valor in ((verde, 1), (rojo, 0)):
+                for fila in filas_con_valor(columna, valor):
+                    cell = ws.cell(row=fila, column=col)
+                    cell.fill = relleno
                     cell.font = fuente_blanca
-                cell.alignment = Alignment(horizontal="center", vertical="center")
         
-        wb.save(workbook_path)
         print(f"[OK] Colores condicionales aplicados a {sheet_name}", flush=True)
     except Exception as e:
         print(f"[ADVERTENCIA] No se pudieron aplicar colores: {e}", flush=True)
 
+# El libro se arma una sola vez en memoria: si el archivo está bloqueado
+# (abierto en Excel) se guardan los mismos bytes con otro nombre, sin volver
+# a escribir las hojas ni a aplicar los colores
+libro = BytesIO()
+with pd.ExcelWriter(libro, engine='openpyxl') as writer:
+    # Tablas principales - Las que usas
+    df_stock.to_excel(writer, sheet_name='StockGeneral', index=False)
+    df_listademateriales.to_excel(writer, sheet_name='ListaMateriales', index=False)
+    df_stock_acumulado.to_excel(writer, sheet_name='StockAcumulado', index=False)
+    df_resumen.to_excel(writer, sheet_name='TablaResumen', index=False)
+    
+    # Tabla técnica - Para auditoría del motor de cálculo
+    df_pedidos_componentes_stock.to_excel(writer, sheet_name='PedidosComponentesStock', index=False)
+    
+    # Aplicar colores condicionales antes de guardar
+    aplicar_colores_disponibilidad(writer, df_resumen, 'TablaResumen')
+contenido_excel = libro.getvalue()
+
 try:
-    with pd.ExcelWriter(excel_filename, engine='openpyxl') as writer:
-        # Tablas principales - Las que usas
-        df_stock.to_excel(writer, sheet_name='StockGeneral', index=False)
-        df_listademateriales.to_excel(writer, sheet_name='ListaMateriales', index=False)
-        df_stock_acumulado.to_excel(writer, sheet_name='StockAcumulado', index=False)
-        df_resumen.to_excel(writer, sheet_name='TablaResumen', index=False)
-        
-        # Tabla técnica - Para auditoría del motor de cálculo
-        df_pedidos_componentes_stock.to_excel(writer, sheet_name='PedidosComponentesStock', index=False)
-    
-    # Aplicar colores condicionales después de guardar
-    aplicar_colores_disponibilidad(excel_filename, 'TablaResumen')
+    with open(excel_filename, 'wb') as archivo:
+        archivo.write(contenido_excel)
     
     print(f"[OK] Archivo guardado: {excel_filename}", flush=True)
 except PermissionError:
-    excel_filename = os.path.join(RUTA_SALIDA, 'tablas_unificadas_temp.xlsx')
-    with pd.ExcelWriter(excel_filename, engine='openpyxl') as writer:
-        # Tablas principales - Las que usas
-        df_stock.to_excel(writer, sheet_name='StockGeneral', index=False)
-        df_listademateriales.to_excel(writer, sheet_name='ListaMateriales', index=False)
-        df_stock_acumulado.to_excel(writer, sheet_name='StockAcumulado', index=False)
-        df_resumen.to_excel(writer, sheet_name='TablaResumen', index=False)
-        
-        # Tabla técnica - Para auditoría del motor de cálculo
-        df_pedidos_componentes_stock.to_excel(writer, sheet_name='PedidosComponentesStock', index=False)
-    
-    # Aplicar colores condicionales después de guardar
-    aplicar_colores_disponibilidad(excel_filename, 'TablaResumen')
+    excel_filename = os.path.join(ruta_salida(), 'tablas_unificadas_temp.xlsx')
+    with open(excel_filename, 'wb') as archivo:
+        archivo.write(contenido_excel)
     
     print(f"⚠️  Archivo bloqueado, guardado como: {excel_filename}", flush=True)
 
-print("\n[INFO] Proceso completado. Cerrando en 5 segundos...", flush=True)
-for i in range(5, 0, -1):
-    print(f"[INFO] Cerrando en {i}...", flush=True)
-    time.sleep(1)
+# La cuenta regresiva solo sirve para alcanzar a leer la consola; si la salida
+# no es una terminal (ejecución programada, redirigida a archivo) se cierra de inmediato
+if sys.stdout is not None and sys.stdout.isatty():
+    print("\n[INFO] Proceso completado. Cerrando en 5 segundos...", flush=True)
+    for i in range(5, 0, -1):
+        print(f"[INFO] Cerrando en {i}...", flush=True)
+        time.sleep(1)
+else:
+    print("\n[INFO] Proceso completado.", flush=True)
 print("[OK] ¡Listo!", flush=True)
 # Ejemplo en PowerShell o cmd:
 # python "c:\Users\innjguadalupe\OneDrive - Soluciones de etiquetado Innoprint SA\Escritorio\PYTHON\unificacion.py"
\ No newline at end of file